@@ -0,0 +1,62 @@
+import asyncio
+
+
+class FakeAvatar:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class FakeUser:
+    def __init__(self, name="bench-user"):
+        self.name = name
+        # Like a user with Discord's default avatar: no custom avatar, display_avatar is the default one
+        self.avatar = None
+        self.display_avatar = FakeAvatar()
+
+
+# interaction.response: records the defer/send/edit calls a command makes
+class FakeInteractionResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.deferred = False
+
+    async def defer(self, thinking=False, ephemeral=False):
+        await self.interaction.round_trip()
+        self.deferred = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self.interaction.round_trip()
+        self.interaction.sent.append(dict(kwargs, content=content))
+
+    async def edit_message(self, **kwargs):
+        await self.interaction.round_trip()
+        self.interaction.sent.append(kwargs)
+
+
+# interaction.followup: records every followup message instead of sending it
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.round_trip()
+        self.interaction.sent.append(dict(kwargs, content=content))
+
+
+# Stand-in for discord.Interaction with an optional simulated Discord API round trip
+class FakeInteraction:
+    def __init__(self, user=None, latency_ms=0.0):
+        self.user = user or FakeUser()
+        self.latency = latency_ms / 1000
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+        # kwargs of every message sent, in order
+        self.sent = []
+
+    async def round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # Embeds sent across every followup message
+    @property
+    def embeds(self):
+        return [embed for message in self.sent for embed in message.get("embeds", [])]
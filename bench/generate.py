@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+import zlib
+
+# Word lists the synthetic names are built from
+MATERIALS = [
+    "Iron", "Steel", "Copper", "Bronze", "Obsidian", "Ashen", "Mithril", "Oak", "Ebony", "Silk",
+    "Leather", "Hide", "Bone", "Crystal", "Gilded", "Rusted", "Runed", "Verran", "Tulnar", "Kaelar",
+    "Dunzenkell", "Pyrian", "Niküan", "Empyrean", "Vek", "Dwarven", "Elven", "Orcish", "Ancient", "Blessed",
+    "Cursed", "Frozen", "Molten", "Shadow", "Sun", "Moon", "Storm", "Thorn", "Ember", "Void",
+]
+ITEM_BASES = [
+    ("Sword", "primary"), ("Greatsword", "primary"), ("Dagger", "primary"), ("Longbow", "ranged"),
+    ("Staff", "primary"), ("Wand", "secondary"), ("Mace", "primary"), ("Spear", "primary"),
+    ("Shield", "secondary"), ("Helm", "head"), ("Hood", "head"), ("Chestplate", "chest"),
+    ("Robe", "chest"), ("Jerkin", "chest"), ("Gauntlets", "hands"), ("Gloves", "hands"),
+    ("Greaves", "legs"), ("Leggings", "legs"), ("Boots", "feet"), ("Sabatons", "feet"),
+    ("Ring", "ring"), ("Amulet", "neck"), ("Earring", "ear"), ("Belt", "waist"), ("Cloak", "back"),
+    ("Ore", None), ("Ingot", None), ("Plank", None), ("Cloth", None), ("Essence", None),
+]
+ARMOR_CATEGORY = {
+    "Helm": "Heavy", "Chestplate": "Heavy", "Gauntlets": "Heavy", "Greaves": "Heavy", "Sabatons": "Heavy",
+    "Jerkin": "Medium", "Gloves": "Medium", "Leggings": "Medium", "Boots": "Medium",
+    "Hood": "Light", "Robe": "Light",
+}
+SUFFIXES = [
+    "", "", "", "", "of the Bear", "of the Fox", "of Verra", "of the Tide", "of Embers", "of the Warden",
+    "of Night", "of Dawn", "of the Riverlands", "of Ruin", "of the Highlands",
+]
+TIERS = ["", "", " I", " II", " III", " IV", " V", " VI", " VII", " VIII", " IX", " X"]
+CREATURES = [
+    "Goblin", "Kobold", "Bandit", "Skeleton", "Wolf", "Bear", "Boar", "Spider", "Harpy", "Troll",
+    "Ogre", "Wraith", "Cultist", "Drake", "Gnoll", "Ratkin", "Lich", "Golem", "Elemental", "Treant",
+    "Deer", "Elk", "Stag", "Rabbit", "Fox", "Lynx", "Moose", "Bison", "Panther", "Crocodile",
+]
+ROLES = [
+    "", "Warrior", "Archer", "Shaman", "Brute", "Scout", "Chieftain", "Guard", "Alpha", "Elder",
+    "Matriarch", "Berserker", "Mystic", "Stalker", "Runt",
+]
+PLACES = [
+    "Riverlands", "Highlands", "Jundark", "Tidewater", "Winterhold Pass", "Ashen Hollow",
+    "Carphin Ruins", "Sunken Grotto", "Thornwood", "Miraleth", "Halcyon Spire", "Lyneth Bog",
+]
+VENDORS = ["Armorer", "Weaponsmith", "General Goods", "Tailor", "Jeweler", "Quartermaster"]
+RARITIES = ["Common", "Uncommon", "Rare", "Heroic", "Epic", "Legendary"]
+
+
+# Function to make a 19-digit guid like the real codex ones, unique for each index
+def make_guid(index):
+    # 2654435761 is prime and doesn't divide 9 * 10**18, so this never repeats
+    return str(10**18 + index * 2654435761 % (9 * 10**18))
+
+
+# Function to build a _loot array dropping the given item names
+def make_loot(rng, item_names):
+    rewards = [{"itemRewards": [{"_item": {"itemName": name}, "quantity": rng.randint(1, 3)}]} for name in item_names]
+    return [{"guid": make_guid(rng.randrange(10**9)), "rewardDefContainers": [{"rewards": rewards}]}]
+
+
+# Function to build the data of a mob or hunting creature
+def make_creature(rng, index, item_names, pois):
+    creature = rng.choice(CREATURES)
+    role = rng.choice(ROLES)
+    display_name = f"{creature} {role}".strip()
+    low = rng.randint(1, 50)
+    poi = rng.choice(pois) if pois and rng.random() < 0.8 else None
+    drops = rng.sample(item_names, min(len(item_names), rng.randint(0, 8))) if item_names else []
+    return {
+        "guid": make_guid(index),
+        "name": f"{creature}_{role or 'Base'}_{index}",
+        "_displayName": display_name,
+        "description": f"A {display_name.lower()} found across Verra.",
+        "_levelRange": f"{low}-{low + rng.randint(0, 3)}",
+        "populationInstances": [
+            {
+                "respawnTime": str(rng.choice([60, 120, 300, 600, 1800])),
+                "location": {
+                    "x": round(rng.uniform(-400000, 400000), 1),
+                    "y": round(rng.uniform(-400000, 400000), 1),
+                    "z": round(rng.uniform(0, 40000), 1),
+                },
+                "_poi": {"playerFacingName": poi[1]} if poi else None,
+            }
+            for _ in range(rng.randint(1, 3))
+        ],
+        "_loot": make_loot(rng, drops),
+    }
+
+
+# Function to build the data of a POI with humanoid reward tables
+def make_poi(rng, index, name):
+    mobs = [
+        {"_displayName": f"{rng.choice(CREATURES)} {rng.choice(ROLES)}".strip(), "_levelRange": f"{level}-{level + 2}"}
+        for level in (rng.randint(1, 50) for _ in range(rng.randint(1, 9)))
+    ]
+    tables = [
+        {
+            "rewardTableId": {"guid": make_guid(10**12 + index * 8 + table)},
+            "inclusionExpression": {"expression": rng.choice(["character.humanoid", "character.beast", "character.humanoid && level > 10"])},
+        }
+        for table in range(rng.randint(1, 4))
+    ]
+    return {
+        "guid": make_guid(index),
+        "playerFacingName": name,
+        "matchingRewardTables": [{"matchingMobs": mobs}],
+        "pOIRewardTables": tables,
+    }
+
+
+# Function to build the data of an item (a fraction of them are recipes)
+def make_item(rng, index, name, base, slot, material_names, pois):
+    tags = [{"tagName": "Item"}]
+    if base in ARMOR_CATEGORY:
+        tags.append({"tagName": f"Item.Gear.Armor.{ARMOR_CATEGORY[base]}"})
+    if slot:
+        tags.append({"tagName": "Item.Gear"})
+    rarity = rng.randrange(len(RARITIES))
+
+    data = {
+        "guid": make_guid(index),
+        "itemName": name,
+        "description": f"{name}, as described by the codex.",
+        "level": rng.randint(1, 50),
+        "rarityMin": RARITIES[rarity],
+        "rarityMax": RARITIES[min(rarity + rng.randint(0, 3), len(RARITIES) - 1)],
+        "equipSlots": [slot] if slot else [],
+        "gameplayTags": {"gameplayTags": tags},
+        "_craftingRecipes": [],
+        "_soldBy": [],
+        "_rewardFrom": [],
+        "_droppedBy": [],
+        "_droppedIn": [],
+    }
+    if material_names and rng.random() < 0.6:
+        data["_craftingRecipes"] = [
+            {
+                "guid": make_guid(2 * 10**12 + index),
+                "generalResourceCost": [
+                    {"quantity": rng.randint(1, 20), "_item": {"itemName": material}}
+                    for material in rng.sample(material_names, min(len(material_names), rng.randint(1, 4)))
+                ],
+            }
+        ]
+    if rng.random() < 0.2:
+        data["_soldBy"] = [
+            {"_characterName": f"{rng.choice(PLACES)} {vendor}", "name": vendor}
+            for vendor in rng.sample(VENDORS, rng.randint(1, 2))
+        ]
+    roll = rng.random()
+    if roll < 0.3:
+        data["_droppedBy"] = [
+            {"_displayName": f"{rng.choice(CREATURES)} {rng.choice(ROLES)}".strip(), "_levelRange": f"{level}-{level + 2}"}
+            for level in (rng.randint(1, 50) for _ in range(rng.randint(1, 8)))
+        ]
+    elif roll < 0.5 and pois:
+        # Dropped inside POIs: linked to the POI's reward tables through _rewardFrom
+        for poi_guid, poi_name, table_ids in rng.sample(pois, min(len(pois), rng.randint(1, 3))):
+            data["_droppedIn"].append({"playerFacingName": poi_name, "guid": poi_guid})
+            data["_rewardFrom"].append(rng.choice(table_ids))
+    return data
+
+
+# Function to add about detail_kb kilobytes of the fields real codex documents carry but the bot never reads
+# (stat blocks, icons, full copies of linked items, vendors and creatures) to a document and its linked entries
+def add_detail(data, detail_kb):
+    if not detail_kb:
+        return data
+    linked = [
+        entry
+        for key in ("_craftingRecipes", "_soldBy", "_droppedBy", "_droppedIn", "populationInstances")
+        for entry in data.get(key) or []
+        if entry
+    ]
+    blocks = linked + [data]
+    # About 45 bytes per stat entry
+    stat_count = max(1, detail_kb * 1024 // 45 // len(blocks))
+    for block in blocks:
+        block["_details"] = {
+            "iconPath": f"/Game/UI/Icons/{data['guid']}.png",
+            "stats": [{"stat": f"Stat{i % 97}", "value": i * 1.5, "tier": i % 5} for i in range(stat_count)],
+        }
+    return data
+
+
+# Function to compute the generated search columns migrate.py adds (None when the row has no such field)
+def search_columns(data):
+    item_name = data.get("itemName")
+    armor_category = None
+    for tag in data.get("gameplayTags", {}).get("gameplayTags", []):
+        tag_name = tag.get("tagName", "").lower()
+        if tag_name.startswith("item.gear.armor."):
+            armor_category = tag_name.rsplit(".", 1)[1]
+            break
+    return (
+        item_name.lower() if item_name else None,
+        data["name"].lower() if data.get("name") else None,
+        data["_displayName"].lower() if data.get("_displayName") else None,
+        armor_category,
+    )
+
+
+# Function to write a synthetic codex/hunting_creature database of about `rows` codex rows
+def generate(path, rows=10000, hunts=None, seed=1, with_search_columns=True, detail_kb=0):
+    rng = random.Random(seed)
+    hunts = max(rows // 20, 1) if hunts is None else hunts
+    poi_count = max(rows // 100, 1)
+    mob_count = max(rows // 5, 1)
+    item_count = max(rows - poi_count - mob_count, 1)
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    extra_columns = ", item_name_lc TEXT, mob_name_lc TEXT, display_name_lc TEXT, armor_category TEXT, data_crc INTEGER" if with_search_columns else ""
+    conn.execute(f"CREATE TABLE codex (guid TEXT PRIMARY KEY, section TEXT, data TEXT{extra_columns})")
+    conn.execute(f"CREATE TABLE hunting_creature (guid TEXT PRIMARY KEY, data TEXT{', data_crc INTEGER' if with_search_columns else ''})")
+    placeholders = "?, ?, ?, ?, ?, ?, ?, ?" if with_search_columns else "?, ?, ?"
+    insert_codex = f"INSERT INTO codex VALUES ({placeholders})"
+
+    def codex_row(section, data):
+        raw = json.dumps(add_detail(data, detail_kb))
+        row = (data["guid"], section, raw)
+        return row + search_columns(data) + (zlib.crc32(raw.encode("utf-8")),) if with_search_columns else row
+
+    index = 0
+    pois = []
+    batch = []
+    for poi_index in range(poi_count):
+        name = f"{rng.choice(PLACES)} {rng.choice(['Keep', 'Camp', 'Cave', 'Ruins', 'Outpost', 'Den'])} {poi_index}"
+        data = make_poi(rng, index, name)
+        pois.append((data["guid"], name, [table["rewardTableId"]["guid"] for table in data["pOIRewardTables"]]))
+        batch.append(codex_row("pois", data))
+        index += 1
+    conn.executemany(insert_codex, batch)
+
+    item_names = []
+    material_names = [f"{material} {base}" for material in MATERIALS for base, slot in ITEM_BASES if slot is None]
+    batch = []
+    for _ in range(item_count):
+        base, slot = rng.choice(ITEM_BASES)
+        name = f"{rng.choice(MATERIALS)} {base} {rng.choice(SUFFIXES)}".replace("  ", " ").strip() + rng.choice(TIERS)
+        if rng.random() < 0.1:
+            name = f"Recipe: {name}"
+        else:
+            item_names.append(name)
+        batch.append(codex_row("items", make_item(rng, index, name, base, slot, material_names, pois)))
+        index += 1
+        if len(batch) >= 5000:
+            conn.executemany(insert_codex, batch)
+            batch = []
+    conn.executemany(insert_codex, batch)
+
+    # Mobs and hunting creatures only drop a few thousand distinct items, like the real data
+    droppable = list(dict.fromkeys(item_names))[:5000]
+    batch = []
+    for _ in range(mob_count):
+        batch.append(codex_row("mobs", make_creature(rng, index, droppable, pois)))
+        index += 1
+        if len(batch) >= 5000:
+            conn.executemany(insert_codex, batch)
+            batch = []
+    conn.executemany(insert_codex, batch)
+
+    batch = []
+    for _ in range(hunts):
+        data = make_creature(rng, index, droppable, pois)
+        raw = json.dumps(add_detail(data, detail_kb))
+        batch.append((data["guid"], raw, zlib.crc32(raw.encode("utf-8"))) if with_search_columns else (data["guid"], raw))
+        index += 1
+    conn.executemany(f"INSERT INTO hunting_creature VALUES ({'?, ?, ?' if with_search_columns else '?, ?'})", batch)
+
+    conn.execute("CREATE INDEX idx_codex_section ON codex (section)")
+    if with_search_columns:
+        # Same indexes as migrate.py
+        conn.execute("CREATE INDEX idx_codex_item_name ON codex (item_name_lc)")
+        conn.execute("CREATE INDEX idx_codex_mob_name ON codex (section, mob_name_lc)")
+        conn.execute("CREATE INDEX idx_codex_display_name ON codex (section, display_name_lc)")
+        conn.execute("CREATE INDEX idx_codex_armor_category ON codex (armor_category)")
+        conn.execute("CREATE INDEX idx_codex_data_crc ON codex (data_crc)")
+        conn.execute("CREATE INDEX idx_hunting_creature_data_crc ON hunting_creature (data_crc)")
+    conn.commit()
+    conn.close()
+    return {"items": item_count, "mobs": mob_count, "pois": poi_count, "hunts": hunts}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic codex database for the benchmarks")
+    parser.add_argument("path", help="SQLite file to create (overwritten if it exists)")
+    parser.add_argument("--rows", type=int, default=10000, help="codex rows (items, mobs and POIs)")
+    parser.add_argument("--hunts", type=int, default=None, help="hunting_creature rows (default rows / 20)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-search-columns", action="store_true", help="leave out the migrate.py columns")
+    parser.add_argument("--detail-kb", type=int, default=0, help="unused detail added to each document, in KB")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.path, args.rows, args.hunts, args.seed, not args.no_search_columns, args.detail_kb)
+    print(f"Wrote {args.path} in {time.perf_counter() - start:.1f}s: {counts}")
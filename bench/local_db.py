@@ -0,0 +1,207 @@
+import functools
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import mariadb
+
+# MariaDB-only SQL the bot's queries use, rewritten for SQLite
+_ARROW = re.compile(r"(\w+)->'([^']*)'")
+_SCHEMA_CHECK = re.compile(r"FROM\s+information_schema\.COLUMNS.*?TABLE_NAME = %s AND COLUMN_NAME IN \(([^)]*)\)", re.S | re.I)
+_PATH_PART = re.compile(r"\.(\w+)|\[(\*|\d+)\]")
+
+
+# Function to parse a JSON document, remembering the last few: projection queries evaluate many paths
+# against each row in turn, and MariaDB scans them natively instead of building Python objects every time
+@functools.lru_cache(maxsize=16)
+def _load(doc):
+    return json.loads(doc)
+
+
+# Function to evaluate a MariaDB JSON path ($.a.b[*].c) against a JSON document, returning every match
+# (none for invalid JSON, MariaDB returns NULL with a warning)
+def _json_path(doc, path):
+    try:
+        values = [_load(doc)]
+    except ValueError:
+        return [], "*" in path
+    for key, index in _PATH_PART.findall(path[1:]):
+        found = []
+        for value in values:
+            if key and isinstance(value, dict) and key in value:
+                found.append(value[key])
+            elif index == "*" and isinstance(value, list):
+                found.extend(value)
+            elif index and index != "*" and isinstance(value, list) and int(index) < len(value):
+                found.append(value[int(index)])
+        values = found
+    return values, "*" in path
+
+
+# JSON_EXTRACT with MariaDB's behaviour: JSON text out, wildcard matches wrapped in an array
+def _json_extract(doc, path):
+    if doc is None:
+        return None
+    values, wildcard = _json_path(doc, path)
+    if not values:
+        return None
+    return json.dumps(values if wildcard else values[0])
+
+
+# JSON_LENGTH(doc, path): entries of the array/object at path, 1 for a scalar, NULL if the path is missing
+def _json_length(doc, path):
+    if doc is None:
+        return None
+    values, wildcard = _json_path(doc, path)
+    if not values:
+        return None
+    value = values[0]
+    return len(value) if isinstance(value, (list, dict)) else 1
+
+
+# JSON_OBJECT(key, value, ...): values are JSON text from JSON_EXTRACT (or numbers), embedded as JSON
+# like MariaDB does for JSON function results
+def _json_object(*args):
+    return json.dumps({
+        key: json.loads(value) if isinstance(value, str) else value
+        for key, value in zip(args[::2], args[1::2])
+    })
+
+
+def _json_valid(doc):
+    if doc is None:
+        return None
+    try:
+        _load(doc)
+    except ValueError:
+        return 0
+    return 1
+
+
+def _json_unquote(text):
+    if text is None or not text.startswith('"'):
+        return text
+    return json.loads(text)
+
+
+# JSON_SEARCH(doc, 'one', value): a path if any string in doc equals value, else NULL
+def _json_search(doc, one_or_all, value):
+    if doc is None:
+        return None
+
+    def walk(node):
+        if isinstance(node, str):
+            return node == value
+        if isinstance(node, list):
+            return any(walk(item) for item in node)
+        if isinstance(node, dict):
+            return any(walk(item) for item in node.values())
+        return False
+
+    return "$" if walk(json.loads(doc)) else None
+
+
+# Function to rewrite one of the bot's MariaDB queries into SQLite
+def translate(query):
+    match = _SCHEMA_CHECK.search(query)
+    if match:
+        return f"SELECT COUNT(*) FROM pragma_table_info(?) WHERE name IN ({match.group(1)})".replace("%s", "?")
+    return _ARROW.sub(r"JSON_EXTRACT(\1, '\2')", query).replace("%s", "?")
+
+
+# Cursor with the parts of the mariadb cursor API the bot uses
+class LocalCursor:
+    def __init__(self, connection, dictionary=False):
+        self.connection = connection
+        self.dictionary = dictionary
+        self._cursor = connection.sqlite.cursor()
+
+    def execute(self, query, params=()):
+        if self.connection.pool.latency:
+            # Stand-in for the network round trip to the database server
+            time.sleep(self.connection.pool.latency)
+        try:
+            self._cursor.execute(translate(query), tuple(params))
+        except sqlite3.Error as e:
+            raise mariadb.Error(str(e)) from e
+
+    def _row(self, row):
+        if row is None:
+            return row
+        # Bytes the rows' text would take on the wire from a database server
+        self.connection.pool.count_fetched(sum(len(value) for value in row if isinstance(value, (str, bytes))))
+        if not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+
+# Pooled SQLite connection standing in for a mariadb pooled connection (close() gives it back)
+class LocalConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.sqlite = sqlite3.connect(pool.path, check_same_thread=False)
+        self.sqlite.create_function("JSON_EXTRACT", 2, _json_extract, deterministic=True)
+        self.sqlite.create_function("JSON_UNQUOTE", 1, _json_unquote, deterministic=True)
+        self.sqlite.create_function("JSON_LENGTH", 2, _json_length, deterministic=True)
+        self.sqlite.create_function("JSON_VALID", 1, _json_valid, deterministic=True)
+        self.sqlite.create_function("JSON_OBJECT", -1, _json_object, deterministic=True)
+        self.sqlite.create_function("JSON_SEARCH", 3, _json_search, deterministic=True)
+        self.sqlite.create_function("CRC32", 1, lambda text: zlib.crc32(text.encode("utf-8")) if text is not None else None, deterministic=True)
+        self.sqlite.create_function("LOWER", 1, lambda text: text.lower() if text is not None else None, deterministic=True)
+
+    def cursor(self, dictionary=False):
+        return LocalCursor(self, dictionary)
+
+    def ping(self):
+        pass
+
+    def reconnect(self):
+        pass
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def close(self):
+        self.pool.release(self)
+
+
+# Fixed-size pool over a SQLite file generated by bench/generate.py, used in place of mariadb.ConnectionPool
+class LocalPool:
+    def __init__(self, path, pool_size=5, latency_ms=0.0):
+        self.path = path
+        self.latency = latency_ms / 1000
+        self._idle = [LocalConnection(self) for _ in range(pool_size)]
+        self._lock = threading.Lock()
+        self.fetched_bytes = 0
+
+    def count_fetched(self, size):
+        with self._lock:
+            self.fetched_bytes += size
+
+    def get_connection(self):
+        with self._lock:
+            if not self._idle:
+                raise mariadb.PoolError("No connection available")
+            return self._idle.pop()
+
+    def release(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.sqlite.close()
+            self._idle = []
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+from bench.fake_discord import FakeInteraction
+from bench.generate import generate
+from bench.local_db import LocalPool
+from codex_data import CodexData
+from db import close_pool, use_pool
+from metrics import current_command, metrics
+from queries import reset_search_columns
+from response_cache import ResponseCache
+from responses import build_dropsource_response, build_hunt_response, build_item_response, build_mob_response, send_response
+from snapshot import export_snapshot, open_snapshot
+
+log = logging.getLogger("bench")
+
+COMMANDS = ("item", "mob", "hunt", "dropsource")
+
+# Search terms that match nothing, so the "not found" path is measured too
+MISSES = ["zzqx", "qwertyuiop", "xylophone"]
+
+
+# Function to pick a weighted mix of full names, single words and misses for each command
+def make_workload(path, seed, size=2000):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    item_names = [name for (name,) in conn.execute(
+        "SELECT json_extract(data, '$.itemName') FROM codex WHERE section = 'items' ORDER BY RANDOM() LIMIT ?", (size,)
+    )]
+    mob_names = [name for (name,) in conn.execute(
+        "SELECT json_extract(data, '$._displayName') FROM codex WHERE section = 'mobs' ORDER BY RANDOM() LIMIT ?", (size,)
+    )]
+    hunt_names = [name for (name,) in conn.execute(
+        "SELECT json_extract(data, '$._displayName') FROM hunting_creature ORDER BY RANDOM() LIMIT ?", (size,)
+    )]
+    drop_names = []
+    for (raw,) in conn.execute("SELECT data FROM codex WHERE section = 'mobs' ORDER BY RANDOM() LIMIT ?", (size // 10 + 1,)):
+        for loot in json.loads(raw).get("_loot", []):
+            for container in loot["rewardDefContainers"]:
+                for reward in container["rewards"]:
+                    drop_names.extend(item["_item"]["itemName"] for item in reward["itemRewards"])
+    conn.close()
+
+    def mix(names, categories=False):
+        terms = []
+        for _ in range(size):
+            name = rng.choice(names) if names else rng.choice(MISSES)
+            roll = rng.random()
+            if roll < 0.45:
+                term = name  # usually a single match
+            elif roll < 0.85:
+                term = rng.choice(name.split())  # a broad match
+            elif roll < 0.95:
+                term = name[:max(3, len(name) // 2)]
+            else:
+                term = rng.choice(MISSES)
+            if categories:
+                category = rng.choice(["Light", "Medium", "Heavy"]) if rng.random() < 0.2 else None
+                terms.append((term, category))
+            else:
+                terms.append((term,))
+        return terms
+
+    return {
+        "item": mix(item_names, categories=True),
+        "mob": mix(mob_names),
+        "hunt": mix(hunt_names),
+        "dropsource": mix(drop_names),
+    }
+
+
+# Function to return the p-th percentile (0-100) of a sorted list
+def percentile(values, p):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+# Builder of each command's reply
+BUILDERS = {
+    "item": build_item_response,
+    "mob": build_mob_response,
+    "hunt": build_hunt_response,
+    "dropsource": build_dropsource_response,
+}
+
+
+# Function to run one command like os.py does: defer, build (or reuse) the reply, send it
+async def handle(codex, response_cache, command, args, interaction):
+    current_command.set(command)
+    args = tuple(arg.strip() if isinstance(arg, str) else arg for arg in args)
+    await interaction.response.defer(thinking=True)
+    with metrics.timer("total"):
+        if response_cache is not None:
+            response = await response_cache.get_or_build(command, args, lambda: BUILDERS[command](codex, *args))
+        else:
+            response = await BUILDERS[command](codex, *args)
+        await send_response(interaction, response)
+
+
+# Function to send `requests` commands through `concurrency` simulated users and time each one
+async def run_command(codex, response_cache, command, terms, requests, concurrency, send_latency_ms):
+    latencies = []
+    errors = 0
+    counter = itertools.count()
+
+    async def user():
+        nonlocal errors
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            interaction = FakeInteraction(latency_ms=send_latency_ms)
+            start = time.perf_counter()
+            try:
+                await handle(codex, response_cache, command, terms[index % len(terms)], interaction)
+            except Exception:
+                errors += 1
+                if errors == 1:
+                    log.exception("/%s %r failed", command, terms[index % len(terms)])
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "latencies": latencies,
+        "stages": {
+            stage: {"count": count, "p50_ms": p50 * 1000, "p99_ms": p99 * 1000}
+            for stage_command, stage, count, p50, p99 in metrics.summary()
+            if stage_command == command
+        },
+    }
+
+
+async def main(args):
+    if args.regenerate or not os.path.exists(args.db):
+        start = time.perf_counter()
+        counts = generate(args.db, args.rows, args.hunts, args.seed, not args.no_search_columns, args.detail_kb)
+        log.info("Generated %s in %.1fs: %s", args.db, time.perf_counter() - start, counts)
+
+    pool = LocalPool(args.db, args.pool_size, args.db_latency_ms)
+    use_pool(pool, args.pool_size)
+    reset_search_columns()
+    codex = CodexData(record_cache_size=args.record_cache_size)
+    response_cache = ResponseCache() if args.response_cache else None
+    workload = make_workload(args.db, args.seed)
+
+    results = {"mode": args.mode, "concurrency": args.concurrency, "commands": {}}
+    if args.mode == "indexed":
+        # Same warm-up the bot does in setup_hook
+        start = time.perf_counter()
+        await codex.refresh_catalog()
+        await codex.refresh_hunts()
+        results["warmup_s"] = time.perf_counter() - start
+        log.info("Loaded the in-memory indexes in %.2fs", results["warmup_s"])
+    elif args.mode == "snapshot":
+        snapshot_path = f"{args.db}.snap"
+        # A file left over from an older snapshot format is exported again too
+        if args.regenerate or not os.path.exists(snapshot_path) or open_snapshot(snapshot_path) is None:
+            start = time.perf_counter()
+            export_snapshot(snapshot_path)
+            log.info("Exported %s in %.2fs", snapshot_path, time.perf_counter() - start)
+        start = time.perf_counter()
+        codex.load_snapshot(snapshot_path)
+        results["warmup_s"] = time.perf_counter() - start
+        log.info("Mapped the snapshot in %.2f ms", results["warmup_s"] * 1000)
+
+    for command in args.commands:
+        if command == "dropsource" and args.mode == "db":
+            log.info("Skipping /dropsource, it only runs against the loot index (use --mode indexed or snapshot)")
+            continue
+        metrics.reset()
+        fetched_before = pool.fetched_bytes
+        results["commands"][command] = await run_command(
+            codex, response_cache, command, workload[command], args.requests, args.concurrency, args.send_latency_ms
+        )
+        results["commands"][command]["fetched_kb"] = (pool.fetched_bytes - fetched_before) / 1024 / args.requests
+    close_pool()
+    return results
+
+
+# Function to run one benchmark process (the --workers processes each run one)
+def run_worker(args):
+    results = asyncio.run(main(args))
+    for result in results["commands"].values():
+        del result["latencies"]
+    return results
+
+
+# Function to run --workers benchmark processes at once over one shared snapshot file, like shards.py does
+def run_workers(args):
+    # Generate the database and export the snapshot once, before the workers map it
+    prepare = argparse.Namespace(**{**vars(args), "commands": []})
+    asyncio.run(main(prepare))
+    args.regenerate = False
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        runs = pool.map(run_worker, [args] * args.workers)
+    elapsed = time.perf_counter() - start
+
+    results = {"mode": f"{args.mode} x{args.workers} workers", "concurrency": args.concurrency, "commands": {}}
+    results["warmup_s"] = max(run["warmup_s"] for run in runs)
+    for command in runs[0]["commands"]:
+        per_worker = [run["commands"][command] for run in runs]
+        results["commands"][command] = {
+            "requests": sum(result["requests"] for result in per_worker),
+            "errors": sum(result["errors"] for result in per_worker),
+            # Worst worker, the latencies themselves aren't sent back
+            "p50_ms": max(result["p50_ms"] for result in per_worker),
+            "p99_ms": max(result["p99_ms"] for result in per_worker),
+            # Every worker runs the commands in the same order, so their runs of a command overlap
+            "throughput": sum(result["throughput"] for result in per_worker),
+            "fetched_kb": sum(result["fetched_kb"] for result in per_worker) / len(per_worker),
+            "stages": {},
+        }
+    log.info("Ran %d workers in %.1fs", args.workers, elapsed)
+    return results
+
+
+# Function to print the results table, with changes against a baseline run if one is given
+def report(results, baseline=None):
+    print(f"mode={results['mode']} concurrency={results['concurrency']}"
+          + (f" warmup={results['warmup_s']:.2f}s" if "warmup_s" in results else ""))
+    print(f"{'command':<12}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'KB/req':>10}")
+    for command, result in results["commands"].items():
+        line = (f"/{command:<11}{result['requests']:>9}{result['errors']:>8}"
+                f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['throughput']:>10.1f}{result['fetched_kb']:>10.1f}")
+        before = (baseline or {}).get("commands", {}).get(command)
+        if before:
+            changes = []
+            for key in ("p50_ms", "p99_ms", "throughput", "fetched_kb"):
+                if before.get(key):
+                    changes.append(f"{key} {(result[key] - before[key]) / before[key]:+.0%}")
+            line += "   vs baseline: " + ", ".join(changes)
+        print(line)
+        for stage, stats in sorted(result["stages"].items()):
+            print(f"    {stage:<15}{stats['count']:>9}{'':>8}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bot's commands against a synthetic local codex")
+    parser.add_argument("--db", default="bench_codex.sqlite", help="SQLite file from bench/generate.py (created if missing)")
+    parser.add_argument("--rows", type=int, default=10000, help="codex rows to generate")
+    parser.add_argument("--hunts", type=int, default=None, help="hunting_creature rows to generate (default rows / 20)")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the database even if it exists")
+    parser.add_argument("--no-search-columns", action="store_true", help="generate without the migrate.py columns")
+    parser.add_argument("--detail-kb", type=int, default=0,
+                        help="unused detail added to each generated document in KB, like the real codex exports")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mode", choices=["db", "indexed", "snapshot"], default="indexed",
+                        help="db: every lookup queries the database, indexed: load the in-memory indexes first, "
+                             "snapshot: export a snapshot file and serve from it")
+    parser.add_argument("--commands", nargs="+", choices=COMMANDS, default=list(COMMANDS))
+    parser.add_argument("--requests", type=int, default=1000, help="requests per command")
+    parser.add_argument("--concurrency", type=int, default=10, help="simulated users sending commands at once")
+    parser.add_argument("--pool-size", type=int, default=5, help="database connections and worker threads")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated database round trip per query")
+    parser.add_argument("--send-latency-ms", type=float, default=0.0, help="simulated Discord API round trip per call")
+    parser.add_argument("--record-cache-size", type=int, default=5000)
+    parser.add_argument("--response-cache", action="store_true", help="serve repeated commands from the response cache")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="benchmark processes sharing one snapshot file (snapshot mode only), like shards.py")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger("bench").setLevel(logging.INFO)
+    if args.workers > 1 and args.mode != "snapshot":
+        parser.error("--workers needs --mode snapshot, only the snapshot is shared between processes")
+    if args.workers > 1:
+        results = run_workers(args)
+    else:
+        results = run_worker(args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
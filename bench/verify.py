@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import zlib
+from bench.generate import generate, make_creature, search_columns
+from bench.local_db import LocalPool
+from bench.run import BUILDERS, COMMANDS, make_workload
+from codex_data import CodexData
+from db import close_pool, use_pool
+from projection import CREATURE_PROJECTION, ITEM_PROJECTION, POI_PROJECTION
+from queries import decode_projected_rows, read_hunt_records, reset_search_columns
+from records import CreatureRecord, ItemRecord, PoiRecord
+
+log = logging.getLogger("bench")
+
+# Codex sections with the projection and whole-document decoder each one is read with
+SECTIONS = {
+    "items": (ITEM_PROJECTION, lambda guid, section, data: ItemRecord.from_data(guid, section, data)),
+    "mobs": (CREATURE_PROJECTION, lambda guid, section, data: CreatureRecord.from_data(guid, data)),
+    "pois": (POI_PROJECTION, lambda guid, section, data: PoiRecord.from_data(guid, data)),
+}
+
+
+# Commands searched for the rows the change feed check renames and inserts, on top of the workload
+CHANGED_TERMS = {
+    "item": [("zephyr", None), ("zephyr", "Light")],
+    "mob": [("zephyr",), ("brand new",)],
+    "hunt": [("quux",)],
+    "dropsource": [("brand new drop",), ("hunt only drop",)],
+}
+
+
+# Function to rewrite one row's data with `change`, keeping the migrate.py columns in step when the table has them
+def rewrite(conn, table, guid, change, with_search_columns=False):
+    (raw,) = conn.execute(f"SELECT data FROM {table} WHERE guid = ?", (guid,)).fetchone()
+    data = json.loads(raw)
+    change(data)
+    raw = json.dumps(data)
+    conn.execute(f"UPDATE {table} SET data = ? WHERE guid = ?", (raw, guid))
+    if with_search_columns and table == "codex":
+        conn.execute(
+            "UPDATE codex SET item_name_lc = ?, mob_name_lc = ?, display_name_lc = ?, armor_category = ?, data_crc = ? "
+            "WHERE guid = ?", search_columns(data) + (zlib.crc32(raw.encode("utf-8")), guid)
+        )
+    elif with_search_columns:
+        conn.execute(f"UPDATE {table} SET data_crc = ? WHERE guid = ?", (zlib.crc32(raw.encode("utf-8")), guid))
+
+
+# Function to plant rows the projections can't describe (and broken JSON) among the generated ones,
+# so the whole-document fallbacks are checked too
+def plant_edge_cases(path):
+    conn = sqlite3.connect(path)
+
+    def first(table, section=None, skip=0):
+        where = "WHERE section = ?" if section else ""
+        (guid,) = conn.execute(
+            f"SELECT guid FROM {table} {where} ORDER BY guid LIMIT 1 OFFSET ?", ((section,) if section else ()) + (skip,)
+        ).fetchone()
+        return guid
+
+    def vendor_without_name(data):
+        data.setdefault("_soldBy", []).append({"_characterName": "Wandering Trader"})
+
+    def empty_recipe(data):
+        data["_craftingRecipes"] = [{}]
+        data.setdefault("gameplayTags", {"gameplayTags": []})["gameplayTags"].append({"tagValue": 1})
+
+    def poi_without_guid(data):
+        data.setdefault("_droppedIn", []).append({"playerFacingName": "Nameless Ruins"})
+
+    def bare_item(data):
+        for key in ("description", "level", "rarityMin", "rarityMax", "equipSlots", "_soldBy", "_droppedBy", "_loot"):
+            data.pop(key, None)
+
+    def bare_population(data):
+        data["populationInstances"] = [{"_poi": None}]
+        data.pop("_levelRange", None)
+
+    def unpopulated(data):
+        data.pop("populationInstances", None)
+        data["_loot"] = []
+
+    def unnamed_mob(data):
+        mobs = data["matchingRewardTables"][0]["matchingMobs"]
+        mobs[:] = [{"_displayName": f"Extra Guard {i}", "_levelRange": "1-3"} for i in range(5)] + [{}, {}]
+        mobs[1]["_displayName"] = None
+
+    def table_without_expression(data):
+        data["pOIRewardTables"].append({"rewardTableId": {"guid": "no-expression"}})
+
+    planted = [
+        ("codex", first("codex", "items", 0), vendor_without_name),
+        ("codex", first("codex", "items", 1), empty_recipe),
+        ("codex", first("codex", "items", 2), poi_without_guid),
+        ("codex", first("codex", "items", 3), bare_item),
+        ("codex", first("codex", "mobs", 0), bare_population),
+        ("codex", first("codex", "mobs", 1), unpopulated),
+        ("codex", first("codex", "pois", 0), unnamed_mob),
+        ("codex", first("codex", "pois", 1), table_without_expression),
+        ("hunting_creature", first("hunting_creature", skip=0), bare_population),
+        ("hunting_creature", first("hunting_creature", skip=1), unpopulated),
+    ]
+    for table, guid, change in planted:
+        rewrite(conn, table, guid, change)
+    for table, guid in (("codex", first("codex", "items", 4)), ("codex", first("codex", "mobs", 2)),
+                        ("codex", first("codex", "pois", 2)), ("hunting_creature", first("hunting_creature", skip=2))):
+        conn.execute(f"UPDATE {table} SET data = '{{broken' WHERE guid = ?", (guid,))
+    conn.commit()
+    conn.close()
+    return len(planted) + 4
+
+
+# Function to return every field of a record, to compare two of them
+def record_fields(record):
+    return {slot: getattr(record, slot) for slot in type(record).__slots__}
+
+
+# Function to compare two lists of records by guid, logging the first few differences
+def compare_records(what, got, expected):
+    expected = {record.guid: record_fields(record) for record in expected}
+    got = {record.guid: record_fields(record) for record in got}
+    mismatches = 0
+    for guid in sorted(expected.keys() | got.keys()):
+        if got.get(guid) != expected.get(guid):
+            mismatches += 1
+            if mismatches <= 3:
+                log.error("%s %s: projected %r, whole document %r", what, guid, got.get(guid), expected.get(guid))
+    log.info("%s: compared %d records, %d mismatches", what, len(expected), mismatches)
+    return mismatches
+
+
+# Function to check that records decoded from the JSON_OBJECT projections (with their whole-document
+# fallbacks) are identical to decoding the whole document, for every codex and hunting_creature row
+def check_projections(path):
+    conn = LocalPool(path, 1).get_connection()
+    cursor = conn.cursor()
+    mismatches = 0
+    for section, (projection, build) in SECTIONS.items():
+        cursor.execute("SELECT guid, section, data FROM codex WHERE section = %s", (section,))
+        expected = []
+        for guid, row_section, raw in cursor.fetchall():
+            try:
+                expected.append(build(guid, row_section, json.loads(raw)))
+            except json.JSONDecodeError:
+                continue
+
+        def decode_full(row):
+            return build(row[0], row[1], json.loads(row[2]))
+
+        cursor.execute(f"SELECT {projection.columns} FROM codex WHERE section = %s", (section,))
+        got = decode_projected_rows(cursor, cursor.fetchall(), projection.decode_row, decode_full)
+        mismatches += compare_records(section, got, expected)
+
+    cursor.execute("SELECT guid, data FROM hunting_creature")
+    expected = []
+    for guid, raw in cursor.fetchall():
+        try:
+            expected.append(CreatureRecord.from_row(guid, raw))
+        except json.JSONDecodeError:
+            continue
+    mismatches += compare_records("hunts", read_hunt_records(cursor), expected)
+    conn.close()
+    return mismatches
+
+
+# Function to delete, rename and insert codex and hunting_creature rows, like a codex import does
+def mutate(path, seed, with_search_columns):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    guids = [guid for (guid,) in conn.execute("SELECT guid FROM codex WHERE section IN ('items', 'mobs') ORDER BY guid")]
+    guids = rng.sample(guids, 600)
+    conn.executemany("DELETE FROM codex WHERE guid = ?", [(guid,) for guid in guids[:200]])
+
+    def rename(data):
+        if "itemName" in data:
+            data["itemName"] = f"Zephyr {data['itemName']}"
+            data.setdefault("gameplayTags", {"gameplayTags": []})["gameplayTags"].append({"tagName": "Item.Gear.Armor.Light"})
+        else:
+            data["_displayName"] = f"Zephyr {data.get('_displayName', '')}"
+            data["_loot"] = []
+
+    for guid in guids[200:]:
+        rewrite(conn, "codex", guid, rename, with_search_columns)
+
+    item_names = [name for (name,) in conn.execute(
+        "SELECT json_extract(data, '$.itemName') FROM codex WHERE section = 'items' ORDER BY guid LIMIT 100"
+    )] + ["Brand New Drop"]
+    for index in range(100):
+        data = make_creature(rng, 10**7 + index, item_names, [])
+        data["_displayName"] = f"Brand New {data['_displayName']}"
+        raw = json.dumps(data)
+        row = (data["guid"], "mobs", raw)
+        if with_search_columns:
+            row += search_columns(data) + (zlib.crc32(raw.encode("utf-8")),)
+        conn.execute(f"INSERT INTO codex VALUES ({', '.join('?' * len(row))})", row)
+
+    hunts = rng.sample([guid for (guid,) in conn.execute("SELECT guid FROM hunting_creature ORDER BY guid")], 60)
+    conn.executemany("DELETE FROM hunting_creature WHERE guid = ?", [(guid,) for guid in hunts[:20]])
+
+    def rename_hunt(data):
+        data["_displayName"] = f"Quux {data.get('_displayName', '')}"
+        data["_loot"] = make_creature(rng, 0, ["Hunt Only Drop"], [])["_loot"]
+
+    for guid in hunts[20:]:
+        rewrite(conn, "hunting_creature", guid, rename_hunt, with_search_columns)
+    conn.commit()
+    conn.close()
+
+
+# Function to turn a reply into something comparable (with its lines sorted when `unordered`)
+def reply_fields(response, unordered):
+    content, embeds = response.content, [embed.to_dict() for embed in response.embeds]
+    if unordered:
+        # Rows patched in place keep their old position among equally ranked matches, a full load sorts by guid
+        content = content and sorted(content.split("\n"))
+        embeds = sorted(map(repr, embeds))
+    return content, embeds, response.view is not None
+
+
+# Function to check that the indexes patched from the change feed give the same replies as a fresh full load
+# after rows are deleted, changed and inserted
+async def check_change_feed(path, seed, with_search_columns):
+    use_pool(LocalPool(path, 5), 5)
+    reset_search_columns()
+    patched = CodexData()
+    await patched.refresh_catalog()
+    await patched.refresh_hunts()
+    # Fill the record caches, the feed has to drop or update what they hold
+    for args in make_workload(path, seed, 300)["item"][:100]:
+        await BUILDERS["item"](patched, *args)
+
+    mutate(path, seed, with_search_columns)
+    await patched.refresh_catalog()
+    await patched.refresh_hunts()
+    fresh = CodexData()
+    await fresh.refresh_catalog()
+    await fresh.refresh_hunts()
+
+    mismatches = 0
+    workload = make_workload(path, seed + 1, 300)
+    for command in COMMANDS:
+        compared = 0
+        for args in workload[command] + CHANGED_TERMS[command]:
+            got = reply_fields(await BUILDERS[command](patched, *args), command != "item")
+            expected = reply_fields(await BUILDERS[command](fresh, *args), command != "item")
+            compared += 1
+            if got != expected:
+                mismatches += 1
+                log.error("/%s %r: patched %r, full load %r", command, args, got[0], expected[0])
+        log.info("/%s: compared %d replies", command, compared)
+
+    for what, got, expected in (
+        ("item prefixes", patched.catalog.item_prefixes, fresh.catalog.item_prefixes),
+        ("mob prefixes", patched.catalog.mob_prefixes, fresh.catalog.mob_prefixes),
+        ("hunt prefixes", patched.hunt_snapshot.prefixes, fresh.hunt_snapshot.prefixes),
+        ("drop prefixes", patched.loot_index.prefixes, fresh.loot_index.prefixes),
+    ):
+        if got.entries != expected.entries:
+            mismatches += 1
+            log.error("%s differ after the patch", what)
+
+    def sources(loot_index):
+        return {key: (name, sorted((source.kind, source.guid) for source in entries))
+                for key, (name, entries) in loot_index.sources.items()}
+
+    if sources(patched.loot_index) != sources(fresh.loot_index):
+        mismatches += 1
+        log.error("loot sources differ after the patch")
+    close_pool()
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the bot's shortcuts give the same results as reading every row in full"
+    )
+    parser.add_argument("--db", default="bench_verify.sqlite", help="SQLite file to generate (overwritten)")
+    parser.add_argument("--rows", type=int, default=20000, help="codex rows to generate")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-search-columns", action="store_true", help="generate without the migrate.py columns")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger("bench").setLevel(logging.INFO)
+    generate(args.db, args.rows, seed=args.seed, with_search_columns=not args.no_search_columns)
+    log.info("Planted %d rows the projections have to fall back on", plant_edge_cases(args.db))
+
+    projection_mismatches = check_projections(args.db)
+    print(f"projections: {projection_mismatches} mismatches")
+    # Without the planted rows, the workload is read with SQLite's own JSON functions
+    generate(args.db, args.rows, seed=args.seed, with_search_columns=not args.no_search_columns)
+    feed_mismatches = asyncio.run(check_change_feed(args.db, args.seed, not args.no_search_columns))
+    print(f"change feed: {feed_mismatches} mismatches")
+    sys.exit(1 if projection_mismatches or feed_mismatches else 0)
@@ -0,0 +1,195 @@
+import json
+import logging
+import mariadb
+from db import get_db_connection, run_db
+from fuzzy import ranked_ids
+from prefix_index import PrefixIndex
+from trigram_index import TrigramIndex
+
+log = logging.getLogger(__name__)
+
+
+# Function to read the searchable names of every codex row (None if the read failed)
+def load_codex_names():
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT guid, section,
+                   JSON_UNQUOTE(JSON_EXTRACT(data, '$.itemName')),
+                   JSON_UNQUOTE(JSON_EXTRACT(data, '$.name')),
+                   JSON_UNQUOTE(JSON_EXTRACT(data, '$._displayName')),
+                   JSON_EXTRACT(data, '$.gameplayTags.gameplayTags[*].tagName')
+            FROM codex
+            """
+        )
+        return cursor.fetchall()
+    except mariadb.Error as e:
+        log.error("Database error in load_codex_names: %s", e)
+        return None
+    finally:
+        conn.close()
+
+
+# Function to build a load_codex_names row from an already decoded codex row
+def name_row(guid, section, data):
+    tags = data.get("gameplayTags", {}).get("gameplayTags", [])
+    raw_tags = json.dumps([tag.get("tagName", "") for tag in tags]) if tags else None
+    return guid, section, data.get("itemName"), data.get("name"), data.get("_displayName"), raw_tags
+
+
+# Most items share one of a handful of armor tag sets, keep a single copy of each
+_shared_tag_sets = {}
+
+
+# Function to keep only the Item.Gear.Armor.* tags (lowercase) from a JSON array of tag names
+def armor_tags(raw_tags):
+    if not raw_tags:
+        return frozenset()
+    tags = frozenset(tag.lower() for tag in json.loads(raw_tags) if tag.lower().startswith("item.gear.armor."))
+    return _shared_tag_sets.setdefault(tags, tags)
+
+
+# Function to move one row from old_name to new_name in a name count, adding/removing autocomplete names as needed
+def rename(counts, prefixes, old_name, new_name):
+    if old_name == new_name:
+        return
+    if new_name is not None:
+        counts[new_name] = counts.get(new_name, 0) + 1
+        if counts[new_name] == 1:
+            prefixes.add(new_name)
+    if old_name is not None:
+        counts[old_name] -= 1
+        if counts[old_name] == 0:
+            del counts[old_name]
+            prefixes.remove(old_name)
+
+
+# Trigram indexes (searches) and prefix indexes (autocomplete) over the item and mob names in codex
+class Catalog:
+    def __init__(self):
+        self.items = TrigramIndex()
+        self.mobs = TrigramIndex()
+        # guid -> (item name, armor tags), lets /item list and filter matches without the database
+        self.item_info = {}
+        # guid -> name the mob is offered under in autocomplete
+        self.mob_info = {}
+        # name -> number of rows using it, so a name only leaves autocomplete with its last row
+        self.item_name_counts = {}
+        self.mob_name_counts = {}
+        self.item_prefixes = PrefixIndex()
+        self.mob_prefixes = PrefixIndex()
+        # Bumped on every change to the indexes, so results computed from them can tell they're stale
+        self.generation = 0
+        self.loaded = False
+
+    # Distinct item and mob names
+    @property
+    def item_names(self):
+        return self.item_name_counts.keys()
+
+    @property
+    def mob_names(self):
+        return self.mob_name_counts.keys()
+
+    # Bring the indexes in line with a fresh name listing, touching only rows that changed
+    def update(self, rows):
+        item_info = {}
+        mob_info = {}
+        item_name_counts = {}
+        mob_name_counts = {}
+        for guid, section, item_name, name, display_name, raw_tags in rows:
+            if item_name:
+                self.items.add(guid, [item_name])
+                item_name_counts[item_name] = item_name_counts.get(item_name, 0) + 1
+                item_info[guid] = (item_name, armor_tags(raw_tags))
+            if section == "mobs" and (name or display_name):
+                self.mobs.add(guid, [name, display_name])
+                mob_name = display_name or name
+                mob_name_counts[mob_name] = mob_name_counts.get(mob_name, 0) + 1
+                mob_info[guid] = mob_name
+
+        for guid in [guid for guid in self.items.doc_ids if guid not in item_info]:
+            self.items.remove(guid)
+        for guid in [guid for guid in self.mobs.doc_ids if guid not in mob_info]:
+            self.mobs.remove(guid)
+        self.item_info = item_info
+        self.mob_info = mob_info
+        self.item_name_counts = item_name_counts
+        self.mob_name_counts = mob_name_counts
+        self.generation += 1
+        self.loaded = True
+
+    # Patch the indexes in place with changed name rows and deleted guids from the change feed
+    def apply(self, rows, deleted=()):
+        self.generation += 1
+        for guid, section, item_name, name, display_name, raw_tags in rows:
+            if item_name:
+                self.items.add(guid, [item_name])
+                old_info = self.item_info.get(guid)
+                rename(self.item_name_counts, self.item_prefixes, old_info and old_info[0], item_name)
+                self.item_info[guid] = (item_name, armor_tags(raw_tags))
+            else:
+                self._remove_item(guid)
+            if section == "mobs" and (name or display_name):
+                self.mobs.add(guid, [name, display_name])
+                rename(self.mob_name_counts, self.mob_prefixes, self.mob_info.get(guid), display_name or name)
+                self.mob_info[guid] = display_name or name
+            else:
+                self._remove_mob(guid)
+
+        for guid in deleted:
+            self._remove_item(guid)
+            self._remove_mob(guid)
+
+    def _remove_item(self, guid):
+        info = self.item_info.pop(guid, None)
+        if info is not None:
+            self.items.remove(guid)
+            rename(self.item_name_counts, self.item_prefixes, info[0], None)
+
+    def _remove_mob(self, guid):
+        mob_name = self.mob_info.pop(guid, None)
+        if mob_name is not None:
+            self.mobs.remove(guid)
+            rename(self.mob_name_counts, self.mob_prefixes, mob_name, None)
+
+    # Reload the names in the database worker threads
+    async def refresh(self):
+        rows = await run_db(load_codex_names)
+        if rows is None:
+            log.warning("Codex catalog refresh failed, keeping the previous indexes")
+            return False
+        old_item_names, old_mob_names = frozenset(self.item_names), frozenset(self.mob_names)
+        if self.loaded:
+            self.update(rows)
+        else:
+            # First build runs in a worker thread, nothing reads the indexes until it is done
+            await run_db(self.update, rows)
+
+        # Sorting every name is the slow part, so only redo it when the names changed
+        if self.item_names != old_item_names:
+            self.item_prefixes = await run_db(PrefixIndex, self.item_names)
+        if self.mob_names != old_mob_names:
+            self.mob_prefixes = await run_db(PrefixIndex, self.mob_names)
+        log.info("Codex catalog indexed %d item(s) and %d mob(s)", len(self.items), len(self.mobs))
+        return True
+
+    # Find the item document ids whose name contains term (or is closest to it), best first,
+    # optionally within an armor category (filtered before ranking, see RankedIds)
+    def item_matches(self, term, category=None):
+        item_info = self.item_info
+        guids = self.items.guids
+        matches = ranked_ids(self.items, term).where(lambda doc_id: guids[doc_id] in item_info)
+        if category:
+            tag = f"item.gear.armor.{category.lower()}"
+            matches = matches.where(lambda doc_id: tag in item_info[guids[doc_id]][1])
+        return matches
+
+    # Item name of a document id returned by item_matches
+    def item_name(self, doc_id):
+        return self.item_info[self.items.guids[doc_id]][0]
@@ -0,0 +1,136 @@
+import json
+import logging
+import mariadb
+from catalog import name_row
+from db import get_db_connection
+from metrics import metrics
+from queries import CHECKSUM_COLUMN, _get_rows_by_guid, has_checksum_column
+from records import CreatureRecord, row_checksum
+
+log = logging.getLogger(__name__)
+
+
+# Function to read guid -> CRC32(data) for every row of a table (None if the read failed)
+def load_checksums(table):
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        if has_checksum_column(cursor, table):
+            query = f"SELECT guid, {CHECKSUM_COLUMN} FROM {table}"
+        else:
+            # Hashes every JSON blob on the server, so each poll costs as much as reading the whole table
+            query = f"SELECT guid, CRC32(data) FROM {table}"
+        with metrics.timer("query"):
+            cursor.execute(query)
+            return dict(cursor.fetchall())
+    except mariadb.Error as e:
+        log.error("Database error in load_checksums(%s): %s", table, e)
+        return None
+    finally:
+        conn.close()
+
+
+# Function to decode changed codex rows into catalog name rows, mob records and the guids that aren't mobs
+def decode_codex_rows(rows):
+    name_rows = []
+    mobs = []
+    not_mobs = []
+    for guid, section, raw in rows:
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            log.warning("Error decoding JSON data for row %s: %s", guid, e)
+            continue
+        name_rows.append(name_row(guid, section, data))
+        if section == "mobs":
+            mobs.append(CreatureRecord.from_data(guid, data))
+        else:
+            not_mobs.append(guid)
+    return name_rows, mobs, not_mobs
+
+
+# Function to decode changed hunting_creature rows into records
+def decode_hunt_rows(rows):
+    records = []
+    for guid, raw in rows:
+        try:
+            records.append(CreatureRecord.from_row(guid, raw))
+        except json.JSONDecodeError as e:
+            log.warning("Error decoding JSON data for row %s: %s", guid, e)
+    return records
+
+
+# What one poll found: decoded changed rows, plus the guids that changed or were deleted
+class Changes:
+    __slots__ = ("rows", "changed", "deleted")
+
+    def __init__(self, rows, changed, deleted):
+        self.rows = rows
+        self.changed = changed
+        self.deleted = deleted
+
+    def __bool__(self):
+        return bool(self.changed or self.deleted)
+
+
+# Remembers a checksum per guid of one table and fetches only the rows that changed since the last poll
+class ChangeFeed:
+    def __init__(self, table, columns, decode):
+        self.table = table
+        # Columns fetched for a changed row, data last
+        self.columns = columns
+        self.decode = decode
+        # guid -> checksum of the version the indexes hold (None until primed)
+        self.checksums = None
+
+    @property
+    def primed(self):
+        return self.checksums is not None
+
+    # Remember the current checksums, call it before a full reload so changes made during the reload aren't missed
+    def prime(self):
+        self.checksums = load_checksums(self.table)
+        return self.checksums is not None
+
+    # Forget the checksums so the next refresh does a full reload
+    def reset(self):
+        self.checksums = None
+
+    # Fetch and decode the rows that changed since the last poll (None if the database couldn't be read)
+    def poll(self):
+        current = load_checksums(self.table)
+        if current is None:
+            return None
+        previous = self.checksums
+        changed = [guid for guid, checksum in current.items() if previous.get(guid) != checksum]
+        deleted = [guid for guid in previous if guid not in current]
+
+        rows = []
+        if changed:
+            conn = get_db_connection()
+            if not conn:
+                return None
+            try:
+                rows = _get_rows_by_guid(conn.cursor(), changed, self.table, self.columns)
+            except mariadb.Error as e:
+                log.error("Database error fetching changed %s rows: %s", self.table, e)
+                return None
+            finally:
+                conn.close()
+
+        # Keep the checksum of what was fetched, the row may have changed again since the listing
+        fetched = set()
+        for row in rows:
+            current[row[0]] = row_checksum(row[-1])
+            fetched.add(row[0])
+        for guid in changed:
+            if guid not in fetched:
+                # Deleted between the listing and the fetch
+                current.pop(guid, None)
+                deleted.append(guid)
+
+        self.checksums = current
+        return Changes(self.decode(rows), [row[0] for row in rows], deleted)
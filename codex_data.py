@@ -0,0 +1,219 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from db import run_db
+from fuzzy import ranked_ids
+from catalog import Catalog
+from change_feed import ChangeFeed, decode_codex_rows, decode_hunt_rows
+from hunt_snapshot import HuntSnapshot
+from loot_index import LootIndex
+from projection import CREATURE_PROJECTION, ITEM_PROJECTION, POI_PROJECTION
+from queries import get_codex_records, get_hunt_data, get_item_name_page, get_mob_data, reset_search_columns
+from records import RecordCache, decode_creature_row, decode_item_row, decode_poi_row
+from snapshot import open_snapshot
+
+log = logging.getLogger(__name__)
+
+# Changed rows patched into the indexes between two yields to the event loop
+APPLY_BATCH_SIZE = 500
+
+# /item queries whose ranked matches are kept for paging through the listing
+ITEM_MATCH_LISTS = 64
+
+# Tries at building an /item page in a worker thread before building it on the event loop
+ITEM_LIST_ATTEMPTS = 3
+
+
+# Function to apply a list of changes in slices, so commands keep being answered during a big update
+async def apply_in_batches(apply, items):
+    for start in range(0, len(items), APPLY_BATCH_SIZE):
+        apply(items[start:start + APPLY_BATCH_SIZE])
+        await asyncio.sleep(0)
+
+
+# Function to rank and recipe-filter the matches of an /item query (unless the ranked matches of an earlier
+# page are given) and read one page of (guid, item name) pairs from them
+def build_item_name_page(catalog, item_type, category, total_any, matches, offset, limit):
+    if matches is None:
+        matches = catalog.item_matches(item_type, category)
+        # Typo suggestions don't count as matches, so "only recipes matched" means the same as in the database
+        total_any = 0 if matches.closest else len(matches)
+        item_name = catalog.item_name
+        # Recipes only show up when one is asked for by its exact name
+        if item_type.lower().startswith("recipe:"):
+            matches = matches.where(lambda doc_id: item_name(doc_id).lower() == item_type.lower())
+        else:
+            matches = matches.where(lambda doc_id: not item_name(doc_id).lower().startswith("recipe:"))
+    guids = catalog.items.guids
+    page = [(guids[doc_id], catalog.item_name(doc_id)) for doc_id in matches[offset:offset + limit]]
+    return total_any, matches, page
+
+
+# Everything the commands read codex data through: name indexes, snapshots and record caches
+class CodexData:
+    def __init__(self, record_cache_size=5000, record_cache_ttl=600):
+        # In-memory copy of hunting_creature, loaded at startup and refreshed in the background
+        self.hunt_snapshot = HuntSnapshot()
+        # Trigram name indexes over codex items and mobs, same loading scheme as the hunt snapshot
+        self.catalog = Catalog()
+        # Decoded codex rows keyed by guid, so popular items/mobs skip the database and json.loads
+        self.item_cache = RecordCache(decode_item_row, max_size=record_cache_size, ttl=record_cache_ttl)
+        self.mob_cache = RecordCache(decode_creature_row, max_size=record_cache_size, ttl=record_cache_ttl)
+        self.poi_cache = RecordCache(decode_poi_row, max_size=record_cache_size, ttl=record_cache_ttl)
+        # Item -> mobs/hunting creatures that drop it, built from every codex mob and hunt snapshot row
+        self.loot_index = LootIndex()
+        # Per-row checksums, after the first full load only changed rows are fetched and patched in
+        self.codex_feed = ChangeFeed("codex", "guid, section, data", decode_codex_rows)
+        self.hunt_feed = ChangeFeed("hunting_creature", "guid, data", decode_hunt_rows)
+        # Memory-mapped snapshot file (see snapshot.py), when set everything is served from it
+        self.snapshot = None
+        # (item type, category) -> (catalog, catalog generation, matches before the recipe filter, ranked doc ids after it)
+        self.item_match_lists = OrderedDict()
+
+    # Serve every command from a snapshot file instead of the database (False if it couldn't be loaded)
+    def load_snapshot(self, path):
+        snapshot = open_snapshot(path)
+        if snapshot is None:
+            return False
+        self.catalog = snapshot.catalog()
+        self.hunt_snapshot = snapshot.hunt_snapshot()
+        self.loot_index = snapshot.loot_index()
+        self.snapshot = snapshot
+        return True
+
+    # Reload the hunting creature snapshot and its part of the loot index
+    async def refresh_hunts(self):
+        if self.snapshot is not None:
+            # Comes from the snapshot file, reloaded by refresh_catalog
+            return False
+        if self.hunt_feed.primed:
+            return await self.apply_hunt_changes()
+
+        # Checksums are taken first so a row changed during the full load is fetched again by the next poll
+        await run_db(self.hunt_feed.prime)
+        if not await self.hunt_snapshot.refresh():
+            self.hunt_feed.reset()
+            return False
+        await self.loot_index.update_hunts(self.hunt_snapshot.records.values())
+        return True
+
+    # Patch the hunt snapshot and loot index with the hunting_creature rows changed since the last poll
+    async def apply_hunt_changes(self):
+        changes = await run_db(self.hunt_feed.poll)
+        if not changes:
+            return False
+        await apply_in_batches(self.hunt_snapshot.apply, changes.rows)
+        self.hunt_snapshot.apply([], changes.deleted)
+        async with self.loot_index.lock:
+            await apply_in_batches(lambda records: self.loot_index.apply("hunt", records), changes.rows)
+            self.loot_index.apply("hunt", [], changes.deleted)
+        log.info("Hunt snapshot applied %d changed and %d deleted row(s)", len(changes.changed), len(changes.deleted))
+        return True
+
+    # Reload the codex name indexes and the mob part of the loot index
+    async def refresh_catalog(self):
+        if self.snapshot is not None:
+            # Map the new file once the export has replaced it
+            return self.snapshot.is_stale() and self.load_snapshot(self.snapshot.path)
+        # Check the schema again, picks up columns migrate.py added while the bot was running
+        reset_search_columns()
+        if self.codex_feed.primed:
+            return await self.apply_codex_changes()
+
+        await run_db(self.codex_feed.prime)
+        refreshed = await self.catalog.refresh()
+        mobs_refreshed = await self.loot_index.refresh_mobs()
+        if not (refreshed and mobs_refreshed):
+            # Part of the full load failed, do it again next time
+            self.codex_feed.reset()
+        return refreshed or mobs_refreshed
+
+    # Patch the catalog, loot index and record caches with the codex rows changed since the last poll
+    async def apply_codex_changes(self):
+        changes = await run_db(self.codex_feed.poll)
+        if not changes:
+            return False
+        name_rows, mobs, not_mobs = changes.rows
+        await apply_in_batches(self.catalog.apply, name_rows)
+        self.catalog.apply([], changes.deleted)
+        async with self.loot_index.lock:
+            await apply_in_batches(lambda records: self.loot_index.apply("mob", records), mobs)
+            self.loot_index.apply("mob", [], changes.deleted + not_mobs)
+        for guid in changes.changed + changes.deleted:
+            self.item_cache.invalidate(guid)
+            self.mob_cache.invalidate(guid)
+            self.poi_cache.invalidate(guid)
+        log.info("Codex catalog applied %d changed and %d deleted row(s)", len(changes.changed), len(changes.deleted))
+        return True
+
+    # Find one page of (guid, item name) matches without fetching any item data
+    # Returns (matches before the recipe filter, matches after it, page), see get_item_name_page about the first
+    async def item_name_page(self, item_type, category=None, offset=0, limit=25):
+        if not self.catalog.loaded:
+            return await run_db(get_item_name_page, item_type, category, offset, limit)
+
+        key = (item_type.strip().lower(), category.lower() if category else None)
+        for attempt in range(ITEM_LIST_ATTEMPTS):
+            catalog = self.catalog
+            generation = catalog.generation
+            entry = self.item_match_lists.get(key)
+            if entry is None or entry[0] is not catalog or entry[1] != generation:
+                entry = (catalog, generation, None, None)
+            # Searching and ranking a broad term takes a while, keep it off the event loop. The change feed
+            # patches the catalog on the loop meanwhile, a result built while the generation moved is thrown away
+            try:
+                total_any, matches, page = await run_db(build_item_name_page, catalog, item_type, category, entry[2], entry[3],
+                                                        offset, limit)
+            except Exception:
+                if catalog is self.catalog and catalog.generation == generation:
+                    raise
+                continue
+            if catalog is self.catalog and catalog.generation == generation:
+                break
+        else:
+            # The catalog kept changing under the worker thread, build it where nothing can patch it meanwhile
+            catalog = self.catalog
+            generation = catalog.generation
+            total_any, matches, page = build_item_name_page(catalog, item_type, category, None, None, offset, limit)
+
+        self.item_match_lists[key] = (catalog, generation, total_any, matches)
+        self.item_match_lists.move_to_end(key)
+        while len(self.item_match_lists) > ITEM_MATCH_LISTS:
+            self.item_match_lists.popitem(last=False)
+        return total_any, len(matches), page
+
+    # Fetch the full record of a single item
+    async def get_item(self, guid):
+        if self.snapshot is not None:
+            return self.snapshot.items.get(guid)
+        records = await run_db(get_codex_records, [guid], self.item_cache, ITEM_PROJECTION)
+        return records[0] if records else None
+
+    # Find mob records by name or display name, best first
+    # Returns (number of matches, records of the first limit of them), only those records are fetched
+    async def find_mobs(self, mob_name, limit):
+        if self.snapshot is not None or self.catalog.loaded:
+            doc_ids = ranked_ids(self.catalog.mobs, mob_name)
+            index_guids = self.catalog.mobs.guids
+            guids = [index_guids[doc_id] for doc_id in doc_ids[:limit]]
+            if self.snapshot is not None:
+                mobs = self.snapshot.mobs
+                return len(doc_ids), [mobs[guid] for guid in guids if guid in mobs]
+            records = await run_db(get_codex_records, guids, self.mob_cache, CREATURE_PROJECTION) if guids else []
+            return len(doc_ids), records
+        return await run_db(get_mob_data, mob_name, self.mob_cache, limit)
+
+    # Find hunting creature records by name or display name
+    async def find_hunts(self, hunt_name):
+        # Look the creature up in the snapshot, or in the database until it has loaded
+        if self.hunt_snapshot.loaded:
+            return self.hunt_snapshot.search(hunt_name)
+        return await run_db(get_hunt_data, hunt_name)
+
+    # Resolve POI guids to records in one query (cached POIs need none)
+    async def find_pois(self, poi_ids):
+        poi_ids = list(dict.fromkeys(poi_ids))
+        if self.snapshot is not None:
+            pois = self.snapshot.pois
+            return {poi_id: pois[poi_id] for poi_id in poi_ids if poi_id in pois}
+        return {poi.guid: poi for poi in await run_db(get_codex_records, poi_ids, self.poi_cache, POI_PROJECTION)}
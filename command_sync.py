@@ -0,0 +1,64 @@
+import hashlib
+import json
+import logging
+import os
+import discord
+
+log = logging.getLogger(__name__)
+
+
+# Function to hash everything Discord stores about the registered commands (names, parameters, descriptions, ...)
+def tree_fingerprint(tree, guild=None):
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Function to read the fingerprints saved by earlier syncs ({} if there are none yet)
+def load_fingerprints(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            fingerprints = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable command sync file %s: %s", path, e)
+        return {}
+    return fingerprints if isinstance(fingerprints, dict) else {}
+
+
+# Function to save the fingerprints, replacing the file in one step so a crash can't leave half of it
+def save_fingerprints(path, fingerprints):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fingerprints, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning("Could not save command sync file %s: %s", path, e)
+
+
+# Function to sync the command tree (to one guild if guild_id is set) only when it changed since the last sync
+async def sync_commands(bot, path, guild_id=None):
+    tree = bot.tree
+    guild = discord.Object(id=guild_id) if guild_id else None
+    if guild is not None:
+        # Guild commands show up instantly, handy while developing
+        tree.copy_global_to(guild=guild)
+    scope = f"{bot.application_id}:guild:{guild_id}" if guild is not None else f"{bot.application_id}:global"
+
+    fingerprint = tree_fingerprint(tree, guild)
+    fingerprints = load_fingerprints(path)
+    if fingerprints.get(scope) == fingerprint:
+        log.info("Commands unchanged since the last sync (%s), skipping it", scope)
+        return False
+
+    try:
+        synced = await tree.sync(guild=guild)
+    except discord.HTTPException as e:
+        log.error("Failed to sync commands (%s): %s", scope, e)
+        return False
+    log.info("Synced %d command(s) (%s): %s", len(synced), scope, [command.name for command in synced])
+    fingerprints[scope] = fingerprint
+    save_fingerprints(path, fingerprints)
+    return True
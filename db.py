@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+import mariadb
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Settings saved by configure(), the pool itself is created on first use
+_config = {}
+_pool = None
+_pool_lock = threading.Lock()
+
+# Worker threads that run blocking queries off the event loop
+_executor = None
+
+# How long to wait for a free pooled connection before giving up
+POOL_ACQUIRE_TIMEOUT = 5.0
+
+
+# Function to store the connection settings and size the pool/executor
+def configure(user, password, host, port, database, pool_size=5, validation_interval=500):
+    global _executor
+    _config.update(
+        user=user,
+        password=password,
+        host=host,
+        port=int(port),
+        database=database,
+        pool_size=int(pool_size),
+        validation_interval=int(validation_interval),
+    )
+    # One worker per pooled connection, so a worker never has to wait on the pool
+    _executor = ThreadPoolExecutor(max_workers=_config["pool_size"], thread_name_prefix="codex-db")
+
+
+# Function to use an already created pool instead of connecting to MariaDB (the benchmarks pass a local stand-in)
+def use_pool(pool, pool_size):
+    global _pool, _executor
+    with _pool_lock:
+        _pool = pool
+    _executor = ThreadPoolExecutor(max_workers=int(pool_size), thread_name_prefix="codex-db")
+
+
+# Function to create the connection pool the first time it is needed
+def _get_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = mariadb.ConnectionPool(
+                pool_name="codexbot",
+                pool_size=_config["pool_size"],
+                pool_reset_connection=False,
+                # Connections idle longer than this (ms) are pinged before reuse
+                pool_validation_interval=_config["validation_interval"],
+                user=_config["user"],
+                password=_config["password"],
+                host=_config["host"],
+                port=_config["port"],
+                database=_config["database"],
+            )
+            log.info("Created MariaDB connection pool with %d connection(s)", _config["pool_size"])
+    return _pool
+
+
+# Function to get a healthy connection from the pool (close() gives it back)
+def get_db_connection():
+    with metrics.timer("db_acquire"):
+        return _acquire_connection()
+
+
+def _acquire_connection():
+    try:
+        pool = _get_pool()
+    except mariadb.Error as e:
+        log.error("Error creating MariaDB connection pool: %s", e)
+        return None
+
+    deadline = time.monotonic() + POOL_ACQUIRE_TIMEOUT
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except mariadb.PoolError:
+            # Every connection is checked out, wait for one to be returned
+            if time.monotonic() >= deadline:
+                log.error("Error connecting to MariaDB: connection pool exhausted")
+                return None
+            time.sleep(0.01)
+
+    # Check the connection is still alive, reconnect it if the server dropped it
+    try:
+        conn.ping()
+    except mariadb.Error:
+        try:
+            conn.reconnect()
+        except mariadb.Error as e:
+            log.error("Error reconnecting to MariaDB: %s", e)
+            conn.close()
+            return None
+    return conn
+
+
+# Function to run a blocking database function in the worker threads
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Run inside a copy of the caller's context so metrics know which command the query belongs to
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+# Function to close every pooled connection and stop the worker threads
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    if _executor is not None:
+        _executor.shutdown(wait=False)
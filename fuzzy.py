@@ -0,0 +1,171 @@
+import heapq
+from collections.abc import Sequence
+from trigram_index import trigrams
+
+try:
+    import numpy as np
+except ImportError:
+    # Without numpy searches are still ranked, only typo suggestions are skipped
+    np = None
+
+# Most names (picked by trigram overlap) scored with edit distance for one query
+MAX_CANDIDATES = 2000
+
+# Names scored together in one NumPy batch
+SCORE_BATCH_SIZE = 512
+
+# Most suggestions returned for a query that matched nothing
+FUZZY_LIMIT = 25
+
+# Matches ranked up front (a few pages), the rest are only sorted once something past them is read
+RANKED_HEAD = 100
+
+# Most ids sorted in one go: a sort holds the GIL throughout, merging sorted runs lets other threads in between
+SORT_RUN = 4096
+
+# Padding for names shorter than the longest one in a batch, never equal to a query character
+PADDING = 0xFFFFFFFF
+
+
+# Function to make the ranking of keys that contain term: exact names, then a word starting with term, then the rest
+# (checked on the newline-joined key as is, ranking a broad term doesn't split every key)
+def rank_key(term):
+    first, line_start, line = f"{term}\n", f"\n{term}", f"\n{term}\n"
+    word_start = f" {term}"
+
+    def key_rank(key):
+        if key == term or key.startswith(first) or key.endswith(line_start) or line in key:
+            return 0, key
+        if key.startswith(term) or line_start in key or word_start in key:
+            return 1, key
+        return 2, key
+    return key_rank
+
+
+# Function to sort ids by key (equal keys keep their order), as sorted runs merged together so ranking many ids
+# in a worker thread doesn't stall the event loop
+def ranked(doc_ids, key):
+    if len(doc_ids) <= SORT_RUN:
+        return sorted(doc_ids, key=key)
+    keyed = [(key(doc_id), position, doc_id) for position, doc_id in enumerate(doc_ids)]
+    runs = [sorted(keyed[start:start + SORT_RUN]) for start in range(0, len(keyed), SORT_RUN)]
+    return [doc_id for _, _, doc_id in heapq.merge(*runs)]
+
+
+# Document ids read best first, sorted only as far as they are read: the first RANKED_HEAD come from a heap,
+# the full sort happens the first time anything past them is asked for
+class RankedIds(Sequence):
+    def __init__(self, doc_ids, key=None, closest=False):
+        self.doc_ids = doc_ids  # unordered matches (already best first when key is None)
+        self.key = key
+        self.closest = closest  # typo suggestions rather than names containing the term
+        self._head = None
+        self._ranked = doc_ids if key is None else None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __getitem__(self, index):
+        if self._ranked is None:
+            if isinstance(index, slice):
+                start, stop, step = index.indices(len(self.doc_ids))
+                in_head = step == 1 and stop <= RANKED_HEAD
+            else:
+                in_head = 0 <= index < RANKED_HEAD
+            if in_head:
+                if self._head is None:
+                    self._head = heapq.nsmallest(RANKED_HEAD, self.doc_ids, key=self.key)
+                return self._head[index]
+            self._ranked = ranked(self.doc_ids, self.key)
+        return self._ranked[index]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    # Same ranking over the ids keep() accepts, filtered before anything is sorted
+    def where(self, keep):
+        return RankedIds([doc_id for doc_id in self.doc_ids if keep(doc_id)], self.key, self.closest)
+
+
+# Function to rank the ids of a trigram index's substring matches best first (lazily, see RankedIds)
+def rank_ids(index, doc_ids, term):
+    term = term.strip().lower()
+    keys = index.keys
+    key_rank = rank_key(term)
+    return RankedIds(doc_ids, lambda doc_id: key_rank(keys[doc_id]))
+
+
+# Function to compute, for each key, the fewest edits that make term appear somewhere in it
+def substring_distances(term, keys):
+    query = np.frombuffer(term.encode("utf-32-le"), dtype=np.uint32)
+    distances = np.empty(len(keys), dtype=np.int32)
+    for start in range(0, len(keys), SCORE_BATCH_SIZE):
+        batch = keys[start:start + SCORE_BATCH_SIZE]
+        width = max(len(key) for key in batch)
+        chars = np.full((len(batch), width), PADDING, dtype=np.uint32)
+        for row, key in enumerate(batch):
+            chars[row, :len(key)] = np.frombuffer(key.encode("utf-32-le"), dtype=np.uint32)
+
+        # Edit distance table, one row per query character: a match may start anywhere in the key (first row
+        # all zeros) and end anywhere (minimum of the last row)
+        columns = np.arange(width + 1, dtype=np.int32)
+        previous = np.zeros((len(batch), width + 1), dtype=np.int32)
+        for i, char in enumerate(query, 1):
+            cost = (chars != char).astype(np.int32)
+            step = np.empty_like(previous)
+            step[:, 0] = i
+            # Substitute/match, or skip the query character
+            step[:, 1:] = np.minimum(previous[:, :-1] + cost, previous[:, 1:] + 1)
+            # Skipping key characters (cell[j] = min(step[j], cell[j - 1] + 1)) as a running minimum
+            previous = np.minimum.accumulate(step - columns, axis=1) + columns
+        distances[start:start + len(batch)] = previous.min(axis=1)
+    return distances
+
+
+# Function to find the documents closest to a term that matched nothing, best first (empty without numpy)
+def fuzzy_ids(index, term, limit=FUZZY_LIMIT):
+    term = term.strip().lower()
+    if np is None or len(term) < 3:
+        return []
+
+    # Prefilter: documents sharing at least a third of the term's trigrams
+    grams = trigrams(term)
+    postings = [index.postings.get(gram) for gram in grams]
+    postings = [np.frombuffer(doc_ids, dtype=np.uint32) for doc_ids in postings if doc_ids is not None and len(doc_ids)]
+    if not postings:
+        return []
+    overlap = np.bincount(np.concatenate(postings))
+    candidates = np.flatnonzero(overlap >= max(1, len(grams) // 3))
+    if len(candidates) > MAX_CANDIDATES:
+        candidates = candidates[np.argpartition(overlap[candidates], -MAX_CANDIDATES)[-MAX_CANDIDATES:]]
+
+    keys = index.keys
+    candidates = [int(doc_id) for doc_id in candidates if keys[doc_id] is not None]
+    if not candidates:
+        return []
+    candidate_keys = [keys[doc_id] for doc_id in candidates]
+    distances = substring_distances(term, candidate_keys)
+
+    # Allow about one typo per four characters
+    max_edits = max(1, len(term) // 4)
+    scored = [
+        (int(distance), key, doc_id)
+        for distance, key, doc_id in zip(distances, candidate_keys, candidates)
+        if distance <= max_edits
+    ]
+    scored.sort()
+    return [doc_id for distance, key, doc_id in scored[:limit]]
+
+
+# Function to search a trigram index best first, falling back to the closest names when nothing contains term
+def ranked_ids(index, term):
+    doc_ids = index.search_ids(term)
+    if doc_ids:
+        return rank_ids(index, doc_ids, term)
+    return RankedIds(fuzzy_ids(index, term), closest=True)
+
+
+# Same as ranked_ids, returning guids
+def ranked_search(index, term):
+    guids = index.guids
+    return [guids[doc_id] for doc_id in ranked_ids(index, term)]
@@ -0,0 +1,86 @@
+import logging
+import mariadb
+from db import get_db_connection, run_db
+from catalog import rename
+from fuzzy import ranked_search
+from prefix_index import PrefixIndex
+from queries import read_hunt_records
+from trigram_index import TrigramIndex
+
+log = logging.getLogger(__name__)
+
+
+# Function to read and parse every hunting creature row (None if the read failed)
+def load_hunt_records():
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        return read_hunt_records(conn.cursor())
+    except mariadb.Error as e:
+        log.error("Database error in load_hunt_records: %s", e)
+        return None
+    finally:
+        conn.close()
+
+
+# In-memory copy of the hunting_creature table with a trigram name index
+class HuntSnapshot:
+    def __init__(self):
+        self.records = {}
+        self.name_index = TrigramIndex()
+        self.prefixes = PrefixIndex()
+        # name -> number of creatures using it, so a name only leaves autocomplete with its last creature
+        self.name_counts = {}
+        self.loaded = False
+
+    # Swap in a freshly loaded set of records, re-indexing only changed names
+    def replace(self, records):
+        new_records = {record.guid: record for record in records}
+        for record in records:
+            self.name_index.add(record.guid, [record.name, record.display_name])
+        for guid in [guid for guid in self.records if guid not in new_records]:
+            self.name_index.remove(guid)
+        name_counts = {}
+        for record in records:
+            name = record.display_name or record.name
+            if name:
+                name_counts[name] = name_counts.get(name, 0) + 1
+        self.records = new_records
+        self.name_counts = name_counts
+        self.prefixes = PrefixIndex(name_counts)
+        self.loaded = True
+
+    # Patch the snapshot in place with changed records and deleted guids from the change feed
+    def apply(self, records, deleted=()):
+        for record in records:
+            old = self.records.get(record.guid)
+            self.name_index.add(record.guid, [record.name, record.display_name])
+            rename(self.name_counts, self.prefixes, old and (old.display_name or old.name) or None,
+                   record.display_name or record.name or None)
+            self.records[record.guid] = record
+        for guid in deleted:
+            old = self.records.pop(guid, None)
+            if old is not None:
+                self.name_index.remove(guid)
+                rename(self.name_counts, self.prefixes, old.display_name or old.name or None, None)
+
+    # Reload the table in the database worker threads
+    async def refresh(self):
+        records = await run_db(load_hunt_records)
+        if records is None:
+            log.warning("Hunt snapshot refresh failed, keeping the previous snapshot")
+            return False
+        if self.loaded:
+            self.replace(records)
+        else:
+            # First build runs in a worker thread, nothing reads the snapshot until it is done
+            await run_db(self.replace, records)
+        log.info("Hunt snapshot loaded %d hunting creature(s)", len(records))
+        return True
+
+    # Find every creature whose name or display name contains hunt_name (or the closest ones), best first
+    def search(self, hunt_name):
+        records = self.records
+        return [records[guid] for guid in ranked_search(self.name_index, hunt_name) if guid in records]
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import mariadb
+from db import get_db_connection, run_db
+from fuzzy import ranked_search
+from prefix_index import PrefixIndex
+from projection import CREATURE_PROJECTION
+from queries import decode_projected_rows
+from records import decode_creature_row
+from trigram_index import TrigramIndex
+
+log = logging.getLogger(__name__)
+
+
+# Function to read and parse every mob row in codex (None if the read failed)
+def load_mob_records():
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        # Only the fields the records keep, most of a mob's document is its loot tables
+        cursor.execute(f"SELECT {CREATURE_PROJECTION.columns} FROM codex WHERE section = 'mobs'")
+        return decode_projected_rows(cursor, cursor.fetchall(), CREATURE_PROJECTION.decode_row, decode_creature_row)
+    except mariadb.Error as e:
+        log.error("Database error in load_mob_records: %s", e)
+        return None
+    finally:
+        conn.close()
+
+
+# One mob or hunting creature that drops an item
+class DropSource:
+    __slots__ = ("kind", "guid", "name", "level_range", "poi")
+
+    def __init__(self, kind, guid, name, level_range, poi):
+        self.kind = kind
+        self.guid = guid
+        self.name = name
+        self.level_range = level_range
+        self.poi = poi
+
+
+# Function to order an item's drop sources: mobs, then hunting creatures, each by name
+# (a fixed order, so patching the index in place lists them the same way a full rebuild does)
+def source_order(source):
+    return source.kind != "mob", (source.name or "").lower(), source.guid
+
+
+# Inverted index of item name -> the mobs and hunting creatures that drop it
+class LootIndex:
+    def __init__(self):
+        # kind ("mob" or "hunt") -> {guid: record} the index was built from
+        self.records = {}
+        # lowercase item name -> (item name, list of DropSource)
+        self.sources = {}
+        # guid -> de-duplicated drop names of that mob/creature
+        self.drops = {}
+        self.names = TrigramIndex()
+        self.prefixes = PrefixIndex()
+        self.loaded = False
+        # Held by whoever changes the index (a rebuild in a worker thread or a change-feed patch on the event
+        # loop), so they run one at a time without the loop ever waiting on a thread
+        self.lock = asyncio.Lock()
+
+    # Replace the records of one kind and rebuild the index
+    def update(self, kind, records):
+        self.records[kind] = {record.guid: record for record in records}
+
+        sources = {}
+        drops = {}
+        for record_kind, kind_records in self.records.items():
+            for record in kind_records.values():
+                drops[record.guid] = record.drops
+                source = DropSource(
+                    record_kind,
+                    record.guid,
+                    record.display_name or record.name,
+                    record.level_range,
+                    record.poi,
+                )
+                for item_name in record.drops:
+                    entry = sources.get(item_name.lower())
+                    if entry is None:
+                        entry = sources[item_name.lower()] = (item_name, [])
+                    entry[1].append(source)
+        for item_name, item_sources in sources.values():
+            item_sources.sort(key=source_order)
+
+        names = TrigramIndex()
+        for key in sources:
+            names.add(key, [key])
+
+        self.sources = sources
+        self.drops = drops
+        self.names = names
+        self.prefixes = PrefixIndex(item_name for item_name, item_sources in sources.values())
+        self.loaded = True
+
+    # Patch the index in place with changed records and deleted guids of one kind from the change feed
+    # (callers hold lock)
+    def apply(self, kind, records, deleted=()):
+        kind_records = self.records.setdefault(kind, {})
+        for guid in list(deleted) + [record.guid for record in records]:
+            old = kind_records.pop(guid, None)
+            if old is not None:
+                self._remove_sources(kind, old)
+        for record in records:
+            kind_records[record.guid] = record
+            self._add_sources(kind, record)
+        self.loaded = True
+
+    def _add_sources(self, kind, record):
+        self.drops[record.guid] = record.drops
+        source = DropSource(kind, record.guid, record.display_name or record.name, record.level_range, record.poi)
+        for item_name in record.drops:
+            key = item_name.lower()
+            entry = self.sources.get(key)
+            if entry is None:
+                entry = self.sources[key] = (item_name, [])
+                self.names.add(key, [key])
+                self.prefixes.add(item_name)
+            entry[1].append(source)
+            entry[1].sort(key=source_order)
+
+    def _remove_sources(self, kind, record):
+        self.drops.pop(record.guid, None)
+        for item_name in record.drops:
+            key = item_name.lower()
+            entry = self.sources.get(key)
+            if entry is None:
+                continue
+            entry[1][:] = [source for source in entry[1] if not (source.kind == kind and source.guid == record.guid)]
+            if not entry[1]:
+                del self.sources[key]
+                self.names.remove(key)
+                self.prefixes.remove(entry[0])
+
+    # Reload every codex mob and rebuild the mob part of the index in the worker threads
+    async def refresh_mobs(self):
+        records = await run_db(load_mob_records)
+        if records is None:
+            log.warning("Loot index refresh failed, keeping the previous index")
+            return False
+        async with self.lock:
+            await run_db(self.update, "mob", records)
+        log.info("Loot index covers %d droppable item(s)", len(self.sources))
+        return True
+
+    # Rebuild the hunting creature part of the index from the hunt snapshot's records
+    async def update_hunts(self, records):
+        async with self.lock:
+            await run_db(self.update, "hunt", records)
+
+    # Return the drop names of a mob/creature, or the given fallback if it isn't indexed
+    def drops_for(self, guid, fallback=()):
+        return self.drops.get(guid, fallback)
+
+    # Find droppable item names: the exact name if there is one, otherwise every name containing term
+    # (or the closest names), best first
+    def find_items(self, term):
+        key = term.strip().lower()
+        sources = self.sources
+        if key in sources:
+            return [sources[key][0]]
+        return [sources[match][0] for match in ranked_search(self.names, key) if match in sources]
+
+    # Return (item name, drop sources) for an exact item name
+    def sources_for(self, item_name):
+        return self.sources.get(item_name.lower(), (item_name, []))
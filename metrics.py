@@ -0,0 +1,143 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Command being handled in the current task (copied into database worker threads by run_db)
+current_command = contextvars.ContextVar("current_command", default="background")
+
+
+# Latency histogram with fixed buckets, like a Prometheus histogram
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    # Estimate a quantile by interpolating inside its bucket (same approach as histogram_quantile)
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(self.counts):
+            upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+            if seen + bucket_count >= rank and bucket_count:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return BUCKETS[-1]
+
+
+# Per-(command, stage) latency histograms plus gauges and counters read when exporting
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.gauges = {}  # name -> (help text, function returning the value)
+        self.counters = {}  # name -> (help text, function returning the running total)
+        self._lock = threading.Lock()
+
+    # Record how long a stage took for the current command
+    def observe(self, stage, seconds, command=None):
+        key = (command or current_command.get(), stage)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    # Time the body of a with block as a stage of the current command
+    @contextmanager
+    def timer(self, stage, command=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, command)
+
+    # Forget every observation (the benchmarks reset between commands)
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+    # Register a value that goes up and down (cache size...) to export alongside the histograms
+    def add_gauge(self, name, help_text, func):
+        self.gauges[name] = (help_text, func)
+
+    # Register a running total that only goes up (cache hits...), name it ..._total so rate() works on it
+    def add_counter(self, name, help_text, func):
+        self.counters[name] = (help_text, func)
+
+    # Render everything in the Prometheus text exposition format
+    def render_prometheus(self):
+        lines = [
+            "# HELP codexbot_stage_seconds Time spent in each stage of a command",
+            "# TYPE codexbot_stage_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted((key, list(h.counts), h.count, h.sum) for key, h in self.histograms.items())
+        for (command, stage), counts, count, total in items:
+            labels = f'command="{command}",stage="{stage}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'codexbot_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'codexbot_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"codexbot_stage_seconds_sum{{{labels}}} {total}")
+            lines.append(f"codexbot_stage_seconds_count{{{labels}}} {count}")
+
+        for kind, values in (("gauge", self.gauges), ("counter", self.counters)):
+            for name, (help_text, func) in sorted(values.items()):
+                try:
+                    value = func()
+                except Exception:
+                    log.exception("Failed to read %s %s", kind, name)
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # (command, stage, count, p50, p99) rows for the /stats command
+    def summary(self):
+        with self._lock:
+            return sorted(
+                (command, stage, h.count, h.quantile(0.5), h.quantile(0.99))
+                for (command, stage), h in self.histograms.items()
+            )
+
+    # Serve /metrics over HTTP (aiohttp comes with discord.py)
+    async def start_server(self, host, port):
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(text=self.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log.info("Serving metrics on http://%s:%s/metrics", host, port)
+        return runner
+
+
+# Shared by every module
+metrics = Metrics()
@@ -0,0 +1,88 @@
+import logging
+import os
+import sys
+import mariadb
+from dotenv import load_dotenv
+from db import configure, get_db_connection
+
+log = logging.getLogger(__name__)
+
+# Persisted generated columns so name/category lookups don't parse every JSON blob
+COLUMN_STATEMENTS = [
+    """
+    ALTER TABLE codex ADD COLUMN IF NOT EXISTS item_name_lc VARCHAR(255)
+    AS (LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$.itemName')))) PERSISTENT
+    """,
+    """
+    ALTER TABLE codex ADD COLUMN IF NOT EXISTS mob_name_lc VARCHAR(255)
+    AS (LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$.name')))) PERSISTENT
+    """,
+    """
+    ALTER TABLE codex ADD COLUMN IF NOT EXISTS display_name_lc VARCHAR(255)
+    AS (LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$._displayName')))) PERSISTENT
+    """,
+    # Lets the change feed compare rows without reading their JSON
+    """
+    ALTER TABLE codex ADD COLUMN IF NOT EXISTS data_crc INT UNSIGNED
+    AS (CRC32(data)) PERSISTENT
+    """,
+    """
+    ALTER TABLE hunting_creature ADD COLUMN IF NOT EXISTS data_crc INT UNSIGNED
+    AS (CRC32(data)) PERSISTENT
+    """,
+    # "Item.Gear.Armor.Heavy" in gameplayTags becomes "heavy"
+    r"""
+    ALTER TABLE codex ADD COLUMN IF NOT EXISTS armor_category VARCHAR(64)
+    AS (TRIM(BOTH '"' FROM SUBSTRING_INDEX(
+        REGEXP_SUBSTR(
+            LOWER(JSON_EXTRACT(data, '$.gameplayTags.gameplayTags[*].tagName')),
+            '"item\\.gear\\.armor\\.[^".]+"'
+        ), '.', -1))) PERSISTENT
+    """,
+]
+
+INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS idx_codex_section ON codex (section(64))",
+    "CREATE INDEX IF NOT EXISTS idx_codex_item_name ON codex (item_name_lc)",
+    "CREATE INDEX IF NOT EXISTS idx_codex_mob_name ON codex (section(64), mob_name_lc)",
+    "CREATE INDEX IF NOT EXISTS idx_codex_display_name ON codex (section(64), display_name_lc)",
+    "CREATE INDEX IF NOT EXISTS idx_codex_armor_category ON codex (armor_category)",
+    # Lets the change feed list guid/checksum pairs from the index alone when guid is the primary key
+    "CREATE INDEX IF NOT EXISTS idx_codex_data_crc ON codex (data_crc)",
+    "CREATE INDEX IF NOT EXISTS idx_hunting_creature_data_crc ON hunting_creature (data_crc)",
+]
+
+
+# Function to add the search and checksum columns and indexes (safe to run again)
+def migrate():
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        for statement in COLUMN_STATEMENTS + INDEX_STATEMENTS:
+            log.info("Running: %s", " ".join(statement.split()))
+            cursor.execute(statement)
+        conn.commit()
+        log.info("codex and hunting_creature columns and indexes are up to date")
+        return True
+    except mariadb.Error as e:
+        log.error("Database error during migration: %s", e)
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    load_dotenv()
+    configure(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT", "3306"),
+        database=os.getenv("DB_NAME"),
+        pool_size=1
+    )
+    sys.exit(0 if migrate() else 1)
@@ -1,9 +1,17 @@
+import asyncio
 import discord
-import mariadb
+import logging
 import os
-import json
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 from dotenv import load_dotenv
+from command_sync import sync_commands
+from db import configure
+from metrics import current_command, metrics
+from prefix_index import PrefixIndex
+from codex_data import CodexData
+from response_cache import ResponseCache
+from responses import build_dropsource_response, build_hunt_response, build_item_response, build_mob_response, send_response
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,469 +23,229 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME")
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE", "5")
+DB_POOL_VALIDATION_MS = os.getenv("DB_POOL_VALIDATION_MS", "500")
+HUNT_REFRESH_SECONDS = int(os.getenv("HUNT_REFRESH_SECONDS", "600"))
+CATALOG_REFRESH_SECONDS = int(os.getenv("CATALOG_REFRESH_SECONDS", "600"))
+RECORD_CACHE_SIZE = int(os.getenv("RECORD_CACHE_SIZE", "5000"))
+RECORD_CACHE_TTL = int(os.getenv("RECORD_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "500"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Optional snapshot file written by snapshot.py, served instead of querying the database
+CODEX_SNAPSHOT = os.getenv("CODEX_SNAPSHOT")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# Optional sharding: SHARD_COUNT shards in total, SHARD_IDS the ones this process runs (shards.py sets both)
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+# Fingerprint of the last synced command tree, commands are only synced again when they change
+COMMAND_SYNC_FILE = os.getenv("COMMAND_SYNC_FILE", ".command_sync.json")
+# Optional development guild: commands are synced to it alone, where they show up instantly
+DEV_GUILD_ID = os.getenv("DEV_GUILD_ID")
+
+# Set up logging (set LOG_LEVEL=DEBUG to see per-command details)
+shard_text = f" [shards {SHARD_IDS}]" if SHARD_IDS else ""
+logging.basicConfig(level=LOG_LEVEL, format=f"%(asctime)s %(levelname)s{shard_text} %(name)s: %(message)s")
+log = logging.getLogger("codexbot")
 
 # Check if all environment variables are loaded
 if not all([DISCORD_TOKEN, DB_USER, DB_PASSWORD, DB_HOST, DB_NAME]):
-    print("Error: One or more environment variables are missing.")
+    log.error("One or more environment variables are missing.")
     exit(1)
 
-# Print the Discord token for debugging
-print(f"DISCORD_TOKEN: {DISCORD_TOKEN}")  # Remove in production
+if SHARD_IDS and not SHARD_COUNT:
+    log.error("SHARD_IDS needs SHARD_COUNT (the total number of shards across every process).")
+    exit(1)
 
-# Set up bot with slash commands using app_commands
+# Set up bot with slash commands using app_commands, sharded when SHARD_COUNT or SHARD_IDS is set
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Function to get a database connection
-def get_db_connection():
-    try:
-        port = int(os.getenv("DB_PORT", "3306"))
-        conn = mariadb.connect(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=port,
-            database=DB_NAME
-        )
-        return conn
-    except mariadb.Error as e:
-        print(f"Error connecting to MariaDB: {e}")
-        return None
-
-# Function to fetch item data from the database
-def get_item_data(item_type, category=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-
-    try:
-        cursor = conn.cursor()
-        # Base query to search for items by name (no recipe exclusion)
-        query = """
-        SELECT guid, section, data 
-        FROM codex 
-        WHERE LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$.itemName'))) LIKE LOWER(%s)
-        """
-        params = ('%' + item_type + '%',)
-
-        # Add category filter based on gameplayTags
-        if category:
-            query += " AND JSON_SEARCH(LOWER(data->'$.gameplayTags.gameplayTags[*].tagName'), 'one', LOWER(%s)) IS NOT NULL"
-            params = ('%' + item_type + '%', f'Item.Gear.Armor.{category}')
-
-        cursor.execute(query, params)
-        items = cursor.fetchall()
-
-        if items:
-            print(f"Found {len(items)} items: {[json.loads(item[2]).get('itemName') for item in items]}")
-            return items
-        else:
-            category_text = f" in category '{category}'" if category else ""
-            print(f"No items found for item name: {item_type}{category_text}")
-            return []
-
-    except mariadb.Error as e:
-        print(f"Database error in get_item_data: {e}")
-        return []
-    finally:
-        conn.close()
-
-# Function to fetch hunting creature data from the database
-def get_hunt_data(hunt_name: str):
-    conn = get_db_connection()
-    if not conn:
-        return []
-
-    try:
-        cursor = conn.cursor(dictionary=True)  # Return rows as dictionaries
-        query = "SELECT guid, data FROM hunting_creature"
-        cursor.execute(query)
-        results = cursor.fetchall()
-
-        # Filter results based on hunt_name in the JSON data
-        matching_hunts = []
-        for row in results:
-            try:
-                data = json.loads(row["data"])
-                name = data.get("name", "")
-                display_name = data.get("_displayName", "")
-
-                # Check if hunt_name matches name or display_name
-                if hunt_name.lower() in name.lower() or hunt_name.lower() in display_name.lower():
-                    matching_hunts.append((row["guid"], data))
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON data for row {row['guid']}: {e}")
-
-        return matching_hunts
-    except mariadb.Error as e:
-        print(f"Database error in get_hunt_data: {e}")
-        return []
-    finally:
-        conn.close()
-
-# Function to fetch mob data from the database
-def get_mob_data(mob_name):
-    conn = get_db_connection()
-    if not conn:
-        return []
-
-    try:
-        cursor = conn.cursor()
-        query = """
-        SELECT guid, section, data 
-        FROM codex 
-        WHERE section = 'mobs' 
-        AND (LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$.name'))) LIKE LOWER(%s) 
-             OR LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$._displayName'))) LIKE LOWER(%s))
-        """
-        cursor.execute(query, ('%' + mob_name + '%', '%' + mob_name + '%'))
-        mobs = cursor.fetchall()
-
-        if mobs:
-            print(f"Found {len(mobs)} mobs: {mobs}")
-            return mobs
-        else:
-            print(f"No mobs found for name: {mob_name}")
-            return []
-
-    except mariadb.Error as e:
-        print(f"Database error in get_mob_data: {e}")
-        return []
-    finally:
-        conn.close()
+if SHARD_COUNT or SHARD_IDS:
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        shard_count=int(SHARD_COUNT),
+        shard_ids=[int(shard_id) for shard_id in SHARD_IDS.split(",")] if SHARD_IDS else None
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+
+# Set up the shared connection pool (connections are opened on first use)
+configure(
+    user=DB_USER,
+    password=DB_PASSWORD,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_NAME,
+    pool_size=DB_POOL_SIZE,
+    validation_interval=DB_POOL_VALIDATION_MS
+)
+
+# Name indexes, snapshots and record caches the commands read codex data through (filled in by warm_up)
+codex = CodexData(record_cache_size=RECORD_CACHE_SIZE, record_cache_ttl=RECORD_CACHE_TTL)
+
+# Built replies for repeated lookups, flushed whenever the codex data is reloaded
+response_cache = ResponseCache(max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+# Background task: (re)load the hunting creature snapshot, first run happens at startup
+@tasks.loop(seconds=HUNT_REFRESH_SECONDS)
+async def refresh_hunt_snapshot():
+    if await codex.refresh_hunts():
+        response_cache.bump_version()
+
+# Background task: (re)load the codex name indexes, first run happens at startup
+@tasks.loop(seconds=CATALOG_REFRESH_SECONDS)
+async def refresh_catalog():
+    if await codex.refresh_catalog():
+        response_cache.bump_version()
+
+# Cache sizes and hit counts exported next to the latency histograms
+metrics.add_counter("codexbot_response_cache_hits_total", "Replies served from the response cache", lambda: response_cache.hits)
+metrics.add_counter("codexbot_response_cache_misses_total", "Replies that had to be built", lambda: response_cache.misses)
+metrics.add_gauge("codexbot_response_cache_size", "Replies held in the response cache", lambda: len(response_cache))
+for cache_name, cache in (("item", codex.item_cache), ("mob", codex.mob_cache), ("poi", codex.poi_cache)):
+    metrics.add_counter(f"codexbot_{cache_name}_cache_hits_total", f"{cache_name} records served from cache", lambda cache=cache: cache.hits)
+    metrics.add_counter(f"codexbot_{cache_name}_cache_misses_total", f"{cache_name} records not in cache", lambda cache=cache: cache.misses)
+    metrics.add_gauge(f"codexbot_{cache_name}_cache_size", f"{cache_name} records held in cache", lambda cache=cache: len(cache))
+
+# Function to build (or reuse) a command's reply and send it, timing each stage under the command's name
+async def respond(interaction: discord.Interaction, command, build, *args):
+    current_command.set(command)
+    # Build from the same stripped values the cache key is made of, so "sword " and "sword" get one reply
+    args = tuple(arg.strip() if isinstance(arg, str) else arg for arg in args)
+    with metrics.timer("total"):
+        response = await response_cache.get_or_build(command, args, lambda: build(codex, *args))
+        try:
+            await send_response(interaction, response)
+        except discord.HTTPException:
+            # Don't keep serving a reply Discord rejected
+            response_cache.discard(command, args)
+            raise
+
+# Armor categories offered by /item's category autocomplete
+category_prefixes = PrefixIndex(["Light", "Medium", "Heavy"])
+
+# Function to turn autocomplete names into choices (Discord allows 25, up to 100 characters each)
+def to_choices(names):
+    return [app_commands.Choice(name=name[:100], value=name[:100]) for name in names[:25]]
+
+# Startup work that runs in the background, kept referenced here until it finishes
+startup_tasks = set()
+
+# Function to run a coroutine in the background without delaying the gateway connection
+def start_in_background(coro):
+    task = asyncio.create_task(coro)
+    startup_tasks.add(task)
+    task.add_done_callback(startup_tasks.discard)
+
+# Function to load the codex data, commands are answered from the database until it's done
+async def warm_up():
+    # Mapping the snapshot only takes a few milliseconds, it's done here so importing this file stays cheap
+    if CODEX_SNAPSHOT and not codex.load_snapshot(CODEX_SNAPSHOT):
+        log.warning("Serving from the database instead of the snapshot")
+    refresh_hunt_snapshot.start()
+    refresh_catalog.start()
+
+# Function to sync the slash commands if they changed since the last sync
+async def sync_command_tree():
+    if SHARD_IDS and 0 not in bot.shard_ids:
+        # Commands are global, the process running shard 0 syncs them for everyone
+        return
+    await sync_commands(bot, COMMAND_SYNC_FILE, int(DEV_GUILD_ID) if DEV_GUILD_ID else None)
+
+# Event: Bot is starting up (runs once per process, not on reconnects)
+@bot.event
+async def setup_hook():
+    start_in_background(warm_up())
+    start_in_background(sync_command_tree())
+    if METRICS_PORT:
+        try:
+            await metrics.start_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            log.error("Failed to start metrics server on %s:%s: %s", METRICS_HOST, METRICS_PORT, e)
+
+# Event: one shard connected (sharded mode only)
+@bot.event
+async def on_shard_ready(shard_id):
+    log.info("Shard %d of %d is ready", shard_id, bot.shard_count)
 
 # Event: Bot is ready
 @bot.event
 async def on_ready():
-    print(f'Logged in as {bot.user}')
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s) globally: {[cmd.name for cmd in synced]}")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
+    log.info("Logged in as %s", bot.user)
 
 # Slash Command: /item
 @bot.tree.command(name="item", description="Fetch items of a certain type, optionally by category (light, medium, heavy)")
 async def item(interaction: discord.Interaction, item_type: str, category: str = None):
-    print(f"Received /item command with item_type: {item_type}, category: {category}")
+    log.debug("Received /item command with item_type: %s, category: %s", item_type, category)
     await interaction.response.defer(thinking=True)
 
-    items = get_item_data(item_type, category)
+    await respond(interaction, "item", build_item_response, item_type, category)
 
-    if not items:
-        category_text = f" in category '{category}'" if category else ""
-        await interaction.followup.send(f"No {item_type} items found{category_text}.")
-        return
+# Autocomplete for /item, served from the in-memory prefix indexes (no database access)
+@item.autocomplete("item_type")
+async def item_type_autocomplete(interaction: discord.Interaction, current: str):
+    return to_choices(codex.catalog.item_prefixes.complete(current))
 
-    # Check if the user explicitly requested a recipe
-    is_recipe_request = item_type.lower().startswith("recipe:")
-
-    if is_recipe_request:
-        # Look for an exact recipe match
-        recipe_items = [item for item in items if json.loads(item[2]).get("itemName", "").lower() == item_type.lower()]
-        if recipe_items:
-            items = recipe_items  # Use only the recipe item
-        else:
-            await interaction.followup.send(f"No recipe found for '{item_type}'.")
-            return
-    else:
-        # Filter out recipes unless explicitly requested
-        items = [item for item in items if not json.loads(item[2]).get("itemName", "").lower().startswith("recipe:")]
-
-    if not items:
-        category_text = f" in category '{category}'" if category else ""
-        await interaction.followup.send(f"No non-recipe {item_type} items found{category_text}.")
-        return
-
-    # Handle multiple items (list view)
-    if len(items) > 1:
-        print(f"Multiple items found: {len(items)}")
-        item_names = [json.loads(item[2]).get("itemName", "Unnamed Item") for item in items]
-        category_text = f" in category '{category}'" if category else ""
-        header = f"Found {len(items)} items matching '{item_type}'{category_text}:\n"
-        footer = "\n\nPlease search for any items in this list."
-        
-        item_list = ""
-        max_chars = 2000 - len(header) - len(footer) - 100
-        truncated = False
-        
-        for name in item_names:
-            next_line = f"- {name}\n"
-            if len(item_list) + len(next_line) <= max_chars:
-                item_list += next_line
-            else:
-                truncated = True
-                break
-        
-        response = header + item_list
-        if truncated:
-            response += f"(Showing partial results of {len(items)} total. Refine your search for more details.)\n"
-        response += footer
-        
-        if len(response) > 2000:
-            response = f"Found {len(items)} items matching '{item_type}'{category_text}. Too many to list (over 2000 characters). Please refine your search."
-        
-        print(f"Sending list response, length: {len(response)}")
-        await interaction.followup.send(response)
-
-    # Handle single item (detailed embed)
-    elif len(items) == 1:
-        print(f"Single item found: {json.loads(items[0][2]).get('itemName', 'Unnamed Item')}")
-        guid, section, data = items[0]
-        item_data = json.loads(data)
-
-        item_name = item_data.get("itemName", "Unnamed Item")
-        description = item_data.get("description", "No description available.")
-        level = item_data.get("level", "N/A")
-        rarity_min = item_data.get("rarityMin", "Common")
-        rarity_max = item_data.get("rarityMax", "Legendary")
-        equip_slots = ", ".join(item_data.get("equipSlots", ["N/A"]))
-
-        embed = discord.Embed(
-            title=item_name,
-            description=description,
-            color=discord.Color.blue()
-        )
-        embed.add_field(name="Level", value=str(level), inline=True)
-        embed.add_field(name="Rarity", value=f"{rarity_min} to {rarity_max}", inline=True)
-        embed.add_field(name="Equip Slot", value=equip_slots, inline=True)
-        embed.add_field(name="Section", value=section or "N/A", inline=True)
-
-        if category:
-            embed.add_field(name="Category", value=category.capitalize(), inline=True)
-
-        crafting_recipes = item_data.get("_craftingRecipes", [])
-        if crafting_recipes:
-            recipe = crafting_recipes[0]
-            materials = "\n".join(
-                f"{cost['quantity']}x {cost['_item']['itemName']}"
-                for cost in recipe.get("generalResourceCost", [])
-            )
-            embed.add_field(
-                name="Crafting Recipe",
-                value=materials or "No materials specified.",
-                inline=False
-            )
-
-        sold_by = item_data.get("_soldBy", [])
-        sold_by_text = "\n".join(
-            f"{vendor['_characterName']} ({vendor['name']})" for vendor in sold_by
-        ) if sold_by else "Not sold by any vendors."
-        embed.add_field(name="Sold By", value=sold_by_text, inline=False)
-
-        reward_from = item_data.get("_rewardFrom", [])
-        reward_from_text = "\n".join(
-            str(reward) for reward in reward_from[:5]
-        ) + ("..." if len(reward_from) > 5 else "") if reward_from else "No rewards specified."
-        embed.add_field(name="Reward From", value=reward_from_text, inline=False)
-
-        # Dropped By (Updated Logic)
-        dropped_by = item_data.get("_droppedBy", [])
-        if dropped_by:
-            dropped_by_text = "\n".join(
-                f"{enemy['_displayName']} (Level {enemy['_levelRange']})"
-                for enemy in dropped_by[:5]
-            ) + ("..." if len(dropped_by) > 5 else "")
-        else:
-            # Check _droppedIn for location-based drops
-            dropped_in = item_data.get("_droppedIn", [])
-            if dropped_in:
-                dropped_by_text = ""
-                for poi in dropped_in:
-                    poi_name = poi.get("playerFacingName", "Unknown Location")
-                    poi_id = poi.get("guid", "N/A")
-                    # Fetch mobs from this POI that match the reward table
-                    conn = get_db_connection()
-                    if conn:
-                        try:
-                            cursor = conn.cursor()
-                            query = """
-                            SELECT data 
-                            FROM codex 
-                            WHERE section = 'pois' AND guid = %s
-                            """
-                            cursor.execute(query, (poi_id,))
-                            poi_data = cursor.fetchone()
-                            if poi_data:
-                                poi_json = json.loads(poi_data[0])
-                                reward_tables = poi_json.get("pOIRewardTables", [])
-                                mobs = []
-                                for table in reward_tables:
-                                    table_id = table.get("rewardTableId", {}).get("guid", "")
-                                    # Check if this matches the emblem's reward table
-                                    if table_id in [rt for rt in item_data.get("_rewardFrom", [])] or table_id == "6064632349999038476":  # Adjust based on your data
-                                        inclusion_expr = table.get("inclusionExpression", {}).get("expression", "")
-                                        if "character.humanoid" in inclusion_expr:
-                                            matching_mobs = poi_json.get("matchingRewardTables", [{}])[0].get("matchingMobs", [])
-                                            mobs.extend([
-                                                f"{mob['_displayName']} (Level {mob['_levelRange']})"
-                                                for mob in matching_mobs[:5]
-                                            ])
-                                if mobs:
-                                    dropped_by_text += f"Dropped in {poi_name}:\n" + "\n".join(mobs) + ("..." if len(matching_mobs) > 5 else "")
-                                else:
-                                    dropped_by_text += f"Dropped in {poi_name} by humanoid enemies."
-                            else:
-                                dropped_by_text = "Not dropped by any enemies (location data not found)."
-                            conn.close()
-                        except mariadb.Error as e:
-                            print(f"Database error fetching POI data: {e}")
-                            dropped_by_text = "Error fetching drop location data."
-                    else:
-                        dropped_by_text = "Not dropped by any enemies (database connection failed)."
-            else:
-                dropped_by_text = "Not dropped by any enemies."
-        embed.add_field(name="Dropped By", value=dropped_by_text or "Not dropped by any enemies.", inline=False)
-
-        print("Sending detailed embed")
-        await interaction.followup.send(embed=embed)
+@item.autocomplete("category")
+async def category_autocomplete(interaction: discord.Interaction, current: str):
+    return to_choices(category_prefixes.complete(current))
 
 # Slash Command: /hunt
 @bot.tree.command(name="hunt", description="Fetch hunting creatures by name")
 async def hunt(interaction: discord.Interaction, hunt_name: str):
-    print(f"Received /hunt command with hunt_name: {hunt_name}")
+    log.debug("Received /hunt command with hunt_name: %s", hunt_name)
     await interaction.response.defer(thinking=True)
 
-    # Query hunt data from the database
-    hunts = get_hunt_data(hunt_name)
-
-    if hunts:
-        for guid, data in hunts:
-            # Debug: Log the JSON data for this creature
-            print(f"JSON Data for {hunt_name}:")
-            print(json.dumps(data, indent=2))  # Pretty-print the JSON data
-
-            # Extract data from the JSON
-            name = data.get("_displayName", data.get("name", "Unknown Creature"))
-            description = data.get("description", "No description available.")
-            level_range = data.get("_levelRange", "N/A")
-
-            # Extract respawnTime from populationInstances
-            respawn_time = "N/A"
-            population_instances = data.get("populationInstances", [])
-            if population_instances:
-                first_instance = population_instances[0]
-                respawn_time = first_instance.get("respawnTime", "N/A")  # Extract respawnTime from the first instance
-
-            # Extract location (first instance if available)
-            location = "N/A"
-            if population_instances:
-                first_instance = population_instances[0]
-                loc = first_instance.get("location", {})
-                location = f"**X:** {loc.get('x', 'N/A')}\n**Y:** {loc.get('y', 'N/A')}\n**Z:** {loc.get('z', 'N/A')}"
-
-            # Extract drops (from _loot array)
-            drops = []
-            loot_tables = data.get("_loot", [])
-            for loot in loot_tables:
-                reward_containers = loot.get("rewardDefContainers", [])
-                for container in reward_containers:
-                    rewards = container.get("rewards", [])
-                    for reward in rewards:
-                        item_rewards = reward.get("itemRewards", [])
-                        for item in item_rewards:
-                            item_name = item.get("_item", {}).get("itemName", "Unknown Item")
-                            if item_name not in drops:  # Avoid duplicates
-                                drops.append(item_name)
-
-            # Format drops text
-            drops_text = "\n".join(f"• {drop}" for drop in drops[:5]) + ("\n• ..." if len(drops) > 5 else "") if drops else "No drops specified."
-
-            # Create and send an embed
-            embed = discord.Embed(
-                title=f"🦌 {name}",
-                description=f"*{description}*",
-                color=discord.Color.green()
-            )
-            embed.add_field(name="📊 **Level Range**", value=f"`{level_range}`", inline=True)
-            embed.add_field(name="⏳ **Respawn Time**", value=f"`{respawn_time}`", inline=True)  # Add respawnTime
-            embed.add_field(name="📍 **Location**", value=f"```{location}```", inline=False)
-            embed.add_field(name="🎁 **Drops**", value=f"{drops_text}", inline=False)
-            embed.set_footer(text=f"Requested by {interaction.user.name}", icon_url=interaction.user.avatar.url)
-
-            print(f"Sending embed for hunt: {name}")
-            await interaction.followup.send(embed=embed)
-    else:
-        print(f"No hunting creatures found, sending fallback message")
-        await interaction.followup.send(f"No hunting creatures found matching '{hunt_name}'.")
+    await respond(interaction, "hunt", build_hunt_response, hunt_name)
+
+# Autocomplete for /hunt, served from the hunt snapshot
+@hunt.autocomplete("hunt_name")
+async def hunt_name_autocomplete(interaction: discord.Interaction, current: str):
+    return to_choices(codex.hunt_snapshot.prefixes.complete(current))
 
 # Slash Command: /mob
 @bot.tree.command(name="mob", description="Fetch mobs by name")
 async def mob(interaction: discord.Interaction, mob_name: str):
-    print(f"Received /mob command with mob_name: {mob_name}")
+    log.debug("Received /mob command with mob_name: %s", mob_name)
+    await interaction.response.defer(thinking=True)
+
+    await respond(interaction, "mob", build_mob_response, mob_name)
+
+# Autocomplete for /mob, served from the in-memory prefix indexes (no database access)
+@mob.autocomplete("mob_name")
+async def mob_name_autocomplete(interaction: discord.Interaction, current: str):
+    return to_choices(codex.catalog.mob_prefixes.complete(current))
+
+# Slash Command: /dropsource
+@bot.tree.command(name="dropsource", description="Find the mobs and hunting creatures that drop an item")
+async def dropsource(interaction: discord.Interaction, item_name: str):
+    log.debug("Received /dropsource command with item_name: %s", item_name)
     await interaction.response.defer(thinking=True)
 
-    mobs = get_mob_data(mob_name)
-
-    if mobs:
-        for mob in mobs:
-            guid, section, data = mob
-            mob_data = json.loads(data)
-
-            # Debug: Log the JSON data for this mob
-            print(f"JSON Data for {mob_name}:")
-            print(json.dumps(mob_data, indent=2))  # Pretty-print the JSON data
-
-            # Extract basic mob info
-            name = mob_data.get("_displayName", mob_data.get("name", "Unknown Mob"))
-            description = mob_data.get("description", "No description available.")
-            level_range = mob_data.get("_levelRange", "N/A")
-
-            # Extract respawnTime from populationInstances
-            respawn_time = "N/A"
-            population_instances = mob_data.get("populationInstances", [])
-            if population_instances:
-                first_instance = population_instances[0]
-                respawn_time = first_instance.get("respawnTime", "N/A")  # Extract respawnTime from the first instance
-
-            # Extract location (first instance if available)
-            location = "N/A"
-            if population_instances:
-                first_instance = population_instances[0]
-                loc = first_instance.get("location", {})
-                location = f"**X:** {loc.get('x', 'N/A')}\n**Y:** {loc.get('y', 'N/A')}\n**Z:** {loc.get('z', 'N/A')}"
-
-            # Extract drops (from _loot array)
-            drops = []
-            loot_tables = mob_data.get("_loot", [])
-            for loot in loot_tables:
-                reward_containers = loot.get("rewardDefContainers", [])
-                for container in reward_containers:
-                    rewards = container.get("rewards", [])
-                    for reward in rewards:
-                        item_rewards = reward.get("itemRewards", [])
-                        for item in item_rewards:
-                            item_name = item.get("_item", {}).get("itemName", "Unknown Item")
-                            if item_name not in drops:  # Avoid duplicates
-                                drops.append(item_name)
-
-            # Format drops text
-            drops_text = "\n".join(f"• {drop}" for drop in drops[:5]) + ("\n• ..." if len(drops) > 5 else "") if drops else "No drops specified."
-
-            # Create embed (same as /hunt but with red color)
-            embed = discord.Embed(
-                title=f"🧿 {name}",  # Add an emoji for flair
-                description=f"*{description}*",  # Italicize the description
-                color=discord.Color.red()  # Red color for mobs
-            )
-
-            # Add fields with better formatting
-            embed.add_field(name="📊 **Level Range**", value=f"`{level_range}`", inline=True)
-            embed.add_field(name="⏳ **Respawn Time**", value=f"`{respawn_time}`", inline=True)  # Add respawnTime
-            embed.add_field(name="📍 **Location**", value=f"```{location}```", inline=False)
-            embed.add_field(name="🎁 **Drops**", value=f"{drops_text}", inline=False)
-
-            # Add a thumbnail (optional, replace with a relevant image URL)
-            embed.set_thumbnail(url="https://i.imgur.com/xyz1234.png")  # Replace with your image URL
-
-            # Add a footer with additional info
-            embed.set_footer(text=f"Requested by {interaction.user.name}", icon_url=interaction.user.avatar.url)
-
-            print(f"Sending embed for mob: {name}")
-            await interaction.followup.send(embed=embed)
-    else:
-        print(f"No mobs found, sending fallback message")
-        await interaction.followup.send(f"No mobs found matching '{mob_name}'.")
+    await respond(interaction, "dropsource", build_dropsource_response, item_name)
+
+# Autocomplete for /dropsource, served from the loot index
+@dropsource.autocomplete("item_name")
+async def dropsource_autocomplete(interaction: discord.Interaction, current: str):
+    return to_choices(codex.loot_index.prefixes.complete(current))
+
+# Slash Command: /stats (admins only)
+@bot.tree.command(name="stats", description="Show per-command latency and cache statistics")
+@app_commands.default_permissions(administrator=True)
+async def stats(interaction: discord.Interaction):
+    lines = [f"{'command':<11}{'stage':<13}{'count':>7}{'p50 ms':>9}{'p99 ms':>9}"]
+    for command, stage, count, p50, p99 in metrics.summary():
+        lines.append(f"{command:<11}{stage:<13}{count:>7}{p50 * 1000:>9.1f}{p99 * 1000:>9.1f}")
+    lines.append("")
+    lines.append(f"response cache: {response_cache.hits} hits, {response_cache.misses} misses, {len(response_cache)} held")
+    for cache_name, cache in (("item", codex.item_cache), ("mob", codex.mob_cache), ("poi", codex.poi_cache)):
+        lines.append(f"{cache_name} records: {cache.hits} hits, {cache.misses} misses, {len(cache)} held")
+
+    text = "\n".join(lines)
+    if len(text) > 1990:
+        text = text[:1960] + "\n... (see /metrics for the rest)"
+    await interaction.response.send_message(f"```\n{text}\n```", ephemeral=True)
 
 # Run the bot
-bot.run(DISCORD_TOKEN)
+bot.run(DISCORD_TOKEN, log_handler=None)
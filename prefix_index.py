@@ -0,0 +1,66 @@
+from bisect import bisect_left
+
+
+# Function to list the lowercase keys a name is found under, one per word start
+def word_keys(name):
+    lower = name.lower()
+    # "Iron Sword" can be found by typing "iron" or "sword"
+    keys = []
+    start = 0
+    while start != -1:
+        keys.append(lower[start:])
+        start = lower.find(" ", start)
+        if start != -1:
+            start += 1
+    return keys
+
+
+# Sorted (lowercase key, name) pairs, one per word start, for autocomplete lookups
+class PrefixIndex:
+    def __init__(self, names=()):
+        entries = set()
+        for name in names:
+            if not name:
+                continue
+            for key in word_keys(name):
+                entries.add((key, name))
+        self.entries = sorted(entries)
+        self.keys = [key for key, name in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Insert a name in place (cheap for the few names a change feed brings in)
+    def add(self, name):
+        if not name:
+            return
+        for key in word_keys(name):
+            entry = (key, name)
+            position = bisect_left(self.entries, entry)
+            if position == len(self.entries) or self.entries[position] != entry:
+                self.entries.insert(position, entry)
+                self.keys.insert(position, key)
+
+    # Remove a name that no row uses any more
+    def remove(self, name):
+        if not name:
+            return
+        for key in word_keys(name):
+            entry = (key, name)
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+                del self.keys[position]
+
+    # Return up to limit distinct names having a word that starts with prefix
+    def complete(self, prefix, limit=25):
+        prefix = prefix.strip().lower()
+        results = {}
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.entries) and len(results) < limit:
+            key, name = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            results[name] = None
+            position += 1
+        return list(results)
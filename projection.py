@@ -0,0 +1,190 @@
+import json
+from records import CreatureRecord, ItemRecord, PoiRecord
+
+# Item names anywhere in a _loot array (what CreatureRecord.drops and ItemRecord.drops are built from)
+LOOT_ITEM_NAMES = "$._loot[*].rewardDefContainers[*].rewards[*].itemRewards[*]._item.itemName"
+
+# matchingMobs lines a POI record keeps
+POI_MOB_LINES = 5
+
+
+# Raised when a projected row can't be turned back into exactly the record the whole document gives
+# (e.g. an entry is missing one of two fields that are projected as parallel lists)
+class IncompleteProjection(Exception):
+    pass
+
+
+# Function to select one JSON path of the data column
+def path(json_path):
+    return f"JSON_EXTRACT(data, '{json_path}')"
+
+
+# Function to select the number of entries of an array in the data column (NULL if it's missing)
+def length(json_path):
+    return f"JSON_LENGTH(data, '{json_path}')"
+
+
+# Function to zip projected parallel lists, checking each has one value per entry of the original array
+def zip_entries(count, *columns):
+    if not count:
+        return []
+    columns = [column or [] for column in columns]
+    if any(len(column) != count for column in columns):
+        raise IncompleteProjection()
+    return list(zip(*columns))
+
+
+# Function to rebuild a _loot array holding just the item names the records keep
+def loot_tables(item_names):
+    if not item_names:
+        return []
+    item_rewards = [{"_item": {"itemName": name}} for name in item_names]
+    return [{"rewardDefContainers": [{"rewards": [{"itemRewards": item_rewards}]}]}]
+
+
+# Function to copy the projected top-level fields that are set (missing ones get the record's default)
+def copy_fields(projected, keys):
+    return {key: projected[key] for key in keys if projected.get(key) is not None}
+
+
+# The fields one kind of record needs: MariaDB returns them as a small JSON object instead of the whole document
+class Projection:
+    def __init__(self, fields, expand, build):
+        # (key, SQL expression over data) pairs, invalid JSON projects to nulls so it's checked first
+        self.fields = [("valid", "JSON_VALID(data)")] + fields
+        self.expand = expand  # projected object -> dict shaped like the original data, for from_data
+        self.build = build    # (guid, section, data) -> record
+        self.sql = "JSON_OBJECT(" + ", ".join(f"'{key}', {expr}" for key, expr in self.fields) + ")"
+        # Drop-in replacement for "guid, section, data" in codex queries
+        self.columns = f"guid, section, {self.sql}"
+
+    # Decode one projected row into a record (raises IncompleteProjection if the whole document is needed)
+    def decode(self, guid, section, raw):
+        projected = json.loads(raw)
+        if not projected.get("valid"):
+            # Let the whole document's decode report the broken JSON
+            raise IncompleteProjection()
+        return self.build(guid, section, self.expand(projected))
+
+    # Same as decode, for a (guid, section, projected data) row
+    def decode_row(self, row):
+        return self.decode(*row)
+
+
+def expand_item(projected):
+    data = copy_fields(projected, ("itemName", "description", "level", "rarityMin", "rarityMax", "equipSlots", "_rewardFrom"))
+    if projected.get("recipeCount"):
+        costs = zip_entries(projected.get("costCount"), projected.get("costQuantities"), projected.get("costItems"))
+        data["_craftingRecipes"] = [{"generalResourceCost": [
+            {"quantity": quantity, "_item": {"itemName": item_name}} for quantity, item_name in costs
+        ]}]
+    data["_soldBy"] = [
+        {"_characterName": character, "name": name}
+        for character, name in zip_entries(projected.get("soldByCount"), projected.get("soldByCharacters"), projected.get("soldByNames"))
+    ]
+    data["_droppedBy"] = [
+        {"_displayName": name, "_levelRange": level_range}
+        for name, level_range in zip_entries(projected.get("droppedByCount"), projected.get("droppedByNames"), projected.get("droppedByLevels"))
+    ]
+    data["_droppedIn"] = [
+        {"playerFacingName": name, "guid": guid}
+        for name, guid in zip_entries(projected.get("droppedInCount"), projected.get("droppedInNames"), projected.get("droppedInGuids"))
+    ]
+    data["_loot"] = loot_tables(projected.get("lootItems"))
+    return data
+
+
+def expand_creature(projected):
+    data = copy_fields(projected, ("name", "_displayName", "description", "_levelRange"))
+    if projected.get("populationCount"):
+        instance = copy_fields(projected, ("respawnTime", "location"))
+        instance["_poi"] = {"playerFacingName": projected.get("poiName")}
+        data["populationInstances"] = [instance]
+    data["_loot"] = loot_tables(projected.get("lootItems"))
+    return data
+
+
+def expand_poi(projected):
+    mobs = []
+    for i in range(min(projected.get("mobCount") or 0, POI_MOB_LINES)):
+        name, level_range = projected.get(f"mobName{i}"), projected.get(f"mobLevel{i}")
+        if name is None or level_range is None:
+            raise IncompleteProjection()
+        mobs.append({"_displayName": name, "_levelRange": level_range})
+    # Only the first lines are projected, pad the list so the record still knows there were more
+    mobs.extend({} for _ in range((projected.get("mobCount") or 0) - len(mobs)))
+
+    data = copy_fields(projected, ("playerFacingName",))
+    data["matchingRewardTables"] = [{"matchingMobs": mobs}]
+    data["pOIRewardTables"] = [
+        {"rewardTableId": {"guid": table_id}, "inclusionExpression": {"expression": expression}}
+        for table_id, expression in zip_entries(projected.get("tableCount"), projected.get("tableIds"), projected.get("tableExpressions"))
+    ]
+    return data
+
+
+# Fields of the /item embed
+ITEM_PROJECTION = Projection(
+    [
+        ("itemName", path("$.itemName")),
+        ("description", path("$.description")),
+        ("level", path("$.level")),
+        ("rarityMin", path("$.rarityMin")),
+        ("rarityMax", path("$.rarityMax")),
+        ("equipSlots", path("$.equipSlots")),
+        ("_rewardFrom", path("$._rewardFrom")),
+        ("recipeCount", length("$._craftingRecipes")),
+        ("costCount", length("$._craftingRecipes[0].generalResourceCost")),
+        ("costQuantities", path("$._craftingRecipes[0].generalResourceCost[*].quantity")),
+        ("costItems", path("$._craftingRecipes[0].generalResourceCost[*]._item.itemName")),
+        ("soldByCount", length("$._soldBy")),
+        ("soldByCharacters", path("$._soldBy[*]._characterName")),
+        ("soldByNames", path("$._soldBy[*].name")),
+        ("droppedByCount", length("$._droppedBy")),
+        ("droppedByNames", path("$._droppedBy[*]._displayName")),
+        ("droppedByLevels", path("$._droppedBy[*]._levelRange")),
+        ("droppedInCount", length("$._droppedIn")),
+        ("droppedInNames", path("$._droppedIn[*].playerFacingName")),
+        ("droppedInGuids", path("$._droppedIn[*].guid")),
+        ("lootItems", path(LOOT_ITEM_NAMES)),
+    ],
+    expand_item,
+    ItemRecord.from_data,
+)
+
+# Fields of the /mob and /hunt embeds (and the loot index)
+CREATURE_PROJECTION = Projection(
+    [
+        ("name", path("$.name")),
+        ("_displayName", path("$._displayName")),
+        ("description", path("$.description")),
+        ("_levelRange", path("$._levelRange")),
+        ("populationCount", length("$.populationInstances")),
+        ("respawnTime", path("$.populationInstances[0].respawnTime")),
+        ("location", path("$.populationInstances[0].location")),
+        ("poiName", path("$.populationInstances[0]._poi.playerFacingName")),
+        ("lootItems", path(LOOT_ITEM_NAMES)),
+    ],
+    expand_creature,
+    lambda guid, section, data: CreatureRecord.from_data(guid, data),
+)
+
+# Fields of the POI lines in the /item embed
+POI_PROJECTION = Projection(
+    [("playerFacingName", path("$.playerFacingName")), ("mobCount", length("$.matchingRewardTables[0].matchingMobs"))]
+    + [
+        field
+        for i in range(POI_MOB_LINES)
+        for field in (
+            (f"mobName{i}", path(f"$.matchingRewardTables[0].matchingMobs[{i}]._displayName")),
+            (f"mobLevel{i}", path(f"$.matchingRewardTables[0].matchingMobs[{i}]._levelRange")),
+        )
+    ]
+    + [
+        ("tableCount", length("$.pOIRewardTables")),
+        ("tableIds", path("$.pOIRewardTables[*].rewardTableId.guid")),
+        ("tableExpressions", path("$.pOIRewardTables[*].inclusionExpression.expression")),
+    ],
+    expand_poi,
+    lambda guid, section, data: PoiRecord.from_data(guid, data),
+)
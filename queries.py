@@ -0,0 +1,279 @@
+import json
+import logging
+import mariadb
+from db import get_db_connection
+from metrics import metrics
+from projection import CREATURE_PROJECTION, IncompleteProjection
+from records import CreatureRecord
+
+log = logging.getLogger(__name__)
+
+# Generated search columns added to codex by migrate.py
+SEARCH_COLUMNS = ("item_name_lc", "mob_name_lc", "display_name_lc", "armor_category")
+
+# Generated CRC32(data) column added by migrate.py, lets the change feed skip reading the JSON
+CHECKSUM_COLUMN = "data_crc"
+
+# Most guids sent in a single IN (...) list
+GUID_BATCH_SIZE = 1000
+
+# Cached results of the schema checks: (table, columns) -> whether the table has all of them
+_column_checks = {}
+
+
+# Function to check whether migrate.py has added the given columns to a table (logs missing_message if not)
+def has_columns(cursor, columns, missing_message, table="codex"):
+    found_all = _column_checks.get((table, columns))
+    if found_all is not None:
+        return found_all
+
+    try:
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.execute(
+            f"""
+            SELECT COUNT(*)
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME IN ({placeholders})
+            """,
+            (table,) + columns
+        )
+        (found,) = cursor.fetchone()
+        found_all = _column_checks[(table, columns)] = found == len(columns)
+        if not found_all:
+            log.warning(missing_message)
+    except mariadb.Error as e:
+        # Don't cache a failed check, try again on the next query
+        log.error("Database error checking %s columns %s: %s", table, columns, e)
+        return False
+    return found_all
+
+
+# Function to check whether migrate.py has added the search columns to codex
+def has_search_columns(cursor):
+    return has_columns(cursor, SEARCH_COLUMNS, "codex search columns not found, using JSON queries (run migrate.py to add them)")
+
+
+# Function to check whether migrate.py has added the checksum column to codex or hunting_creature
+def has_checksum_column(cursor, table="codex"):
+    return has_columns(
+        cursor, (CHECKSUM_COLUMN,),
+        f"{table} checksum column not found, hashing every row on every poll (run migrate.py to add it)", table
+    )
+
+
+# Function to forget the cached schema checks (after running the migration)
+def reset_search_columns():
+    _column_checks.clear()
+
+
+# Function to fetch one page of matching item names without their JSON data
+# Returns (matches before the recipe filter, matches after it, [(guid, item name), ...])
+# The first count is only looked up when the second is 0 (to tell "no matches" from "only recipes"), otherwise it
+# repeats the second
+def get_item_name_page(item_type, category=None, offset=0, limit=25):
+    conn = get_db_connection()
+    if not conn:
+        return 0, 0, []
+
+    try:
+        cursor = conn.cursor()
+        if has_search_columns(cursor):
+            # Indexed generated columns (see migrate.py)
+            name_expr = "item_name_lc"
+            where = "item_name_lc LIKE %s"
+            params = ('%' + item_type.lower() + '%',)
+            if category:
+                where += " AND armor_category = %s"
+                params += (category.lower(),)
+        else:
+            name_expr = "LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$.itemName')))"
+            where = f"{name_expr} LIKE LOWER(%s)"
+            params = ('%' + item_type + '%',)
+            # Add category filter based on gameplayTags
+            if category:
+                where += " AND JSON_SEARCH(LOWER(data->'$.gameplayTags.gameplayTags[*].tagName'), 'one', LOWER(%s)) IS NOT NULL"
+                params += (f'Item.Gear.Armor.{category}',)
+
+        # Recipes only show up when one is asked for by its exact name
+        if item_type.lower().startswith("recipe:"):
+            filtered_where = f"{where} AND {name_expr} = %s"
+            filtered_params = params + (item_type.lower(),)
+        else:
+            filtered_where = f"{where} AND {name_expr} NOT LIKE %s"
+            filtered_params = params + ('recipe:%',)
+
+        with metrics.timer("query"):
+            cursor.execute(f"SELECT COUNT(*) FROM codex WHERE {filtered_where}", filtered_params)
+            (total,) = cursor.fetchone()
+        if total == 0:
+            # Only needed to tell "nothing matched" apart from "only recipes matched"
+            with metrics.timer("query"):
+                cursor.execute(f"SELECT COUNT(*) FROM codex WHERE {where}", params)
+                (total_any,) = cursor.fetchone()
+            return total_any, 0, []
+
+        with metrics.timer("query"):
+            cursor.execute(
+                f"""
+                SELECT guid, JSON_UNQUOTE(JSON_EXTRACT(data, '$.itemName'))
+                FROM codex
+                WHERE {filtered_where}
+                ORDER BY {name_expr}
+                LIMIT %s OFFSET %s
+                """,
+                filtered_params + (limit, offset)
+            )
+            page = [(guid, name) for guid, name in cursor.fetchall()]
+        log.debug("Found %d items for item name: %s, page at offset %d has %d", total, item_type, offset, len(page))
+        return total, total, page
+
+    except mariadb.Error as e:
+        log.error("Database error in get_item_name_page: %s", e)
+        return 0, 0, []
+    finally:
+        conn.close()
+
+
+# Function to fetch codex (or hunting_creature) rows by guid, keeping the order of guids
+def _get_rows_by_guid(cursor, guids, table="codex", columns="guid, section, data"):
+    rows = {}
+    for start in range(0, len(guids), GUID_BATCH_SIZE):
+        batch = guids[start:start + GUID_BATCH_SIZE]
+        placeholders = ", ".join(["%s"] * len(batch))
+        query = f"SELECT {columns} FROM {table} WHERE guid IN ({placeholders})"
+        with metrics.timer("query"):
+            cursor.execute(query, tuple(batch))
+            fetched = cursor.fetchall()
+        for row in fetched:
+            rows[row[0]] = row
+    return [rows[guid] for guid in guids if guid in rows]
+
+
+# Function to decode rows fetched with a projection, fetching the whole document of rows it can't describe
+# (decode returns None to skip a row, rows are returned in the order they were fetched)
+def decode_projected_rows(cursor, rows, decode, decode_full, table="codex", columns="guid, section, data"):
+    records = {}
+    incomplete = []
+    for row in rows:
+        try:
+            records[row[0]] = decode(row)
+        except IncompleteProjection:
+            incomplete.append(row[0])
+
+    if incomplete:
+        log.debug("Fetching %d whole %s row(s) the projection couldn't describe", len(incomplete), table)
+        for row in _get_rows_by_guid(cursor, incomplete, table, columns):
+            try:
+                records[row[0]] = decode_full(row)
+            except json.JSONDecodeError as e:
+                log.warning("Error decoding JSON data for row %s: %s", row[0], e)
+    return [records[row[0]] for row in rows if records.get(row[0]) is not None]
+
+
+# Function to decode projected codex rows through a record cache (whole rows go through its own decoder)
+def decode_cached_rows(cursor, rows, cache, projection):
+    return decode_projected_rows(cursor, rows, lambda row: cache.from_row(row, projection.decode_row), cache.from_row)
+
+
+# Function to get the records for guids found by a name index, only fetching cache misses
+# (with a projection only the fields its records need are fetched)
+def get_codex_records(guids, cache, projection=None):
+    records = {}
+    missing = []
+    for guid in guids:
+        record = cache.get(guid)
+        if record is None:
+            missing.append(guid)
+        else:
+            records[guid] = record
+
+    if missing:
+        conn = get_db_connection()
+        if not conn:
+            return []
+        try:
+            cursor = conn.cursor()
+            if projection is None:
+                fetched = [cache.from_row(row) for row in _get_rows_by_guid(cursor, missing)]
+            else:
+                rows = _get_rows_by_guid(cursor, missing, columns=projection.columns)
+                fetched = decode_cached_rows(cursor, rows, cache, projection)
+            for record in fetched:
+                records[record.guid] = record
+        except mariadb.Error as e:
+            log.error("Database error in get_codex_records: %s", e)
+            return []
+        finally:
+            conn.close()
+
+    return [records[guid] for guid in guids if guid in records]
+
+
+# Function to read every hunting creature with only the fields the embeds need
+def read_hunt_records(cursor):
+    with metrics.timer("query"):
+        cursor.execute(f"SELECT guid, NULL, {CREATURE_PROJECTION.sql} FROM hunting_creature")
+        rows = cursor.fetchall()
+    with metrics.timer("decode"):
+        return decode_projected_rows(
+            cursor, rows, CREATURE_PROJECTION.decode_row, lambda row: CreatureRecord.from_row(*row),
+            "hunting_creature", "guid, data"
+        )
+
+
+# Function to fetch hunting creature data from the database
+def get_hunt_data(hunt_name: str):
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    try:
+        cursor = conn.cursor()
+        # Filter the records on hunt_name in their name or display name
+        return [record for record in read_hunt_records(cursor) if hunt_name.lower() in record.search_key]
+    except mariadb.Error as e:
+        log.error("Database error in get_hunt_data: %s", e)
+        return []
+    finally:
+        conn.close()
+
+
+# Function to fetch mob data from the database, decoded through the record cache
+# Returns (number of matches, records of the first limit of them)
+def get_mob_data(mob_name, cache, limit=25):
+    conn = get_db_connection()
+    if not conn:
+        return 0, []
+
+    try:
+        cursor = conn.cursor()
+        if has_search_columns(cursor):
+            # Indexed generated columns (see migrate.py)
+            where = "section = 'mobs' AND (mob_name_lc LIKE %s OR display_name_lc LIKE %s)"
+            pattern = '%' + mob_name.lower() + '%'
+        else:
+            where = """section = 'mobs'
+            AND (LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$.name'))) LIKE LOWER(%s)
+                 OR LOWER(JSON_UNQUOTE(JSON_EXTRACT(data, '$._displayName'))) LIKE LOWER(%s))"""
+            pattern = '%' + mob_name + '%'
+        with metrics.timer("query"):
+            cursor.execute(f"SELECT {CREATURE_PROJECTION.columns} FROM codex WHERE {where} LIMIT %s", (pattern, pattern, limit))
+            rows = cursor.fetchall()
+            total = len(rows)
+            if total == limit:
+                # Only a full page can have more matches behind it
+                cursor.execute(f"SELECT COUNT(*) FROM codex WHERE {where}", (pattern, pattern))
+                (total,) = cursor.fetchone()
+        mobs = decode_cached_rows(cursor, rows, cache, CREATURE_PROJECTION)
+
+        if mobs:
+            log.debug("Found %d mobs for name: %s", total, mob_name)
+        else:
+            log.debug("No mobs found for name: %s", mob_name)
+        return total, mobs
+
+    except mariadb.Error as e:
+        log.error("Database error in get_mob_data: %s", e)
+        return 0, []
+    finally:
+        conn.close()
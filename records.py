@@ -0,0 +1,249 @@
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from metrics import metrics
+
+
+# Function to collect the item names from a _loot array, without duplicates
+def extract_drops(loot_tables):
+    drops = {}
+    for loot in loot_tables or []:
+        for container in loot.get("rewardDefContainers", []):
+            for reward in container.get("rewards", []):
+                for item in reward.get("itemRewards", []):
+                    item_name = item.get("_item", {}).get("itemName", "Unknown Item")
+                    drops[item_name] = None  # dict keeps first-seen order
+    return tuple(drops)
+
+
+# Compact, already parsed copy of a creature row (hunting creature or mob)
+class CreatureRecord:
+    __slots__ = (
+        "guid", "name", "display_name", "description",
+        "level_range", "respawn_time", "location", "poi", "drops",
+    )
+
+    def __init__(self, guid, name, display_name, description, level_range, respawn_time, location, poi, drops):
+        self.guid = guid
+        self.name = name
+        self.display_name = display_name
+        self.description = description
+        self.level_range = level_range
+        self.respawn_time = respawn_time
+        self.location = location
+        self.poi = poi
+        self.drops = drops
+
+    # Build a record from the decoded JSON data of a row
+    @classmethod
+    def from_data(cls, guid, data):
+        respawn_time = "N/A"
+        location = None
+        poi = None
+        population_instances = data.get("populationInstances", [])
+        if population_instances:
+            first_instance = population_instances[0]
+            respawn_time = first_instance.get("respawnTime", "N/A")
+            loc = first_instance.get("location", {})
+            location = (loc.get("x", "N/A"), loc.get("y", "N/A"), loc.get("z", "N/A"))
+            poi = (first_instance.get("_poi") or {}).get("playerFacingName")
+
+        return cls(
+            guid=guid,
+            name=data.get("name", ""),
+            display_name=data.get("_displayName", ""),
+            description=data.get("description", "No description available."),
+            level_range=data.get("_levelRange", "N/A"),
+            respawn_time=respawn_time,
+            location=location,
+            poi=poi,
+            drops=extract_drops(data.get("_loot", [])),
+        )
+
+    # Build a record from a raw (guid, JSON string) row
+    @classmethod
+    def from_row(cls, guid, raw):
+        return cls.from_data(guid, json.loads(raw))
+
+    # Lowercase text that name searches are matched against
+    @property
+    def search_key(self):
+        return f"{self.name}\n{self.display_name}".lower()
+
+    # Location formatted the way the embeds show it
+    @property
+    def location_text(self):
+        if self.location is None:
+            return "N/A"
+        x, y, z = self.location
+        return f"**X:** {x}\n**Y:** {y}\n**Z:** {z}"
+
+
+# Compact, already parsed copy of a codex item row, holding only what the embeds use
+class ItemRecord:
+    __slots__ = (
+        "guid", "section", "item_name", "description", "level", "rarity_min", "rarity_max",
+        "equip_slots", "recipe_materials", "sold_by", "reward_from", "dropped_by", "dropped_in",
+        "drops",
+    )
+
+    def __init__(self, guid, section, item_name, description, level, rarity_min, rarity_max,
+                 equip_slots, recipe_materials, sold_by, reward_from, dropped_by, dropped_in, drops):
+        self.guid = guid
+        self.section = section
+        self.item_name = item_name
+        self.description = description
+        self.level = level
+        self.rarity_min = rarity_min
+        self.rarity_max = rarity_max
+        self.equip_slots = equip_slots
+        self.recipe_materials = recipe_materials
+        self.sold_by = sold_by
+        self.reward_from = reward_from
+        self.dropped_by = dropped_by
+        self.dropped_in = dropped_in
+        self.drops = drops
+
+    # Build a record from the decoded JSON data of a row
+    @classmethod
+    def from_data(cls, guid, section, data):
+        # Materials of the first crafting recipe (None when the item has no recipe)
+        recipe_materials = None
+        crafting_recipes = data.get("_craftingRecipes", [])
+        if crafting_recipes:
+            recipe_materials = tuple(
+                f"{cost.get('quantity')}x {cost.get('_item', {}).get('itemName')}"
+                for cost in crafting_recipes[0].get("generalResourceCost", [])
+            )
+
+        return cls(
+            guid=guid,
+            section=section,
+            item_name=data.get("itemName", ""),
+            description=data.get("description", "No description available."),
+            level=data.get("level", "N/A"),
+            rarity_min=data.get("rarityMin", "Common"),
+            rarity_max=data.get("rarityMax", "Legendary"),
+            equip_slots=tuple(data.get("equipSlots", ["N/A"])),
+            recipe_materials=recipe_materials,
+            sold_by=tuple(
+                f"{vendor.get('_characterName')} ({vendor.get('name')})" for vendor in data.get("_soldBy", [])
+            ),
+            reward_from=tuple(data.get("_rewardFrom", [])),
+            dropped_by=tuple(
+                (enemy.get("_displayName"), enemy.get("_levelRange")) for enemy in data.get("_droppedBy", [])
+            ),
+            dropped_in=tuple(
+                (poi.get("playerFacingName", "Unknown Location"), poi.get("guid", "N/A"))
+                for poi in data.get("_droppedIn", [])
+            ),
+            drops=extract_drops(data.get("_loot", [])),
+        )
+
+
+# Parsed POI row: its name and the mobs behind each humanoid reward table
+class PoiRecord:
+    __slots__ = ("guid", "name", "table_mobs")
+
+    def __init__(self, guid, name, table_mobs):
+        self.guid = guid
+        self.name = name
+        # reward table guid -> (first five "Mob (Level x)" lines, whether there are more)
+        self.table_mobs = table_mobs
+
+    # Build a record from the decoded JSON data of a row
+    @classmethod
+    def from_data(cls, guid, data):
+        matching_mobs = data.get("matchingRewardTables", [{}])[0].get("matchingMobs", [])
+        mob_lines = tuple(f"{mob['_displayName']} (Level {mob['_levelRange']})" for mob in matching_mobs[:5])
+
+        table_mobs = {}
+        for table in data.get("pOIRewardTables", []):
+            table_id = table.get("rewardTableId", {}).get("guid", "")
+            inclusion_expr = table.get("inclusionExpression", {}).get("expression", "")
+            if "character.humanoid" in inclusion_expr:
+                table_mobs[table_id] = (mob_lines, len(matching_mobs) > 5)
+        return cls(guid, data.get("playerFacingName", ""), table_mobs)
+
+
+# Function to decode a (guid, section, data) codex row into an ItemRecord
+def decode_item_row(row):
+    guid, section, raw = row
+    return ItemRecord.from_data(guid, section, json.loads(raw))
+
+
+# Function to decode a (guid, section, data) codex row into a CreatureRecord
+def decode_creature_row(row):
+    guid, section, raw = row
+    return CreatureRecord.from_row(guid, raw)
+
+
+# Function to decode a (guid, section, data) codex row into a PoiRecord
+def decode_poi_row(row):
+    guid, section, raw = row
+    return PoiRecord.from_data(guid, json.loads(raw))
+
+
+# Function to checksum a raw JSON column so a changed row can be spotted without decoding it
+def row_checksum(raw):
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    return zlib.crc32(raw)
+
+
+# Bounded LRU of decoded records keyed by guid, shared by the database worker threads
+class RecordCache:
+    def __init__(self, decode, max_size=5000, ttl=600):
+        self.decode = decode
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # guid -> (checksum, stored at, record)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Return the cached record for a guid, or None if it is missing or expired
+    def get(self, guid):
+        with self._lock:
+            entry = self._entries.get(guid)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(guid)
+            self.hits += 1
+            return entry[2]
+
+    # Return the record for a fetched row, only decoding it if the row changed
+    # (decode overrides the cache's decoder, for rows fetched with a projection)
+    def from_row(self, row, decode=None):
+        guid, raw = row[0], row[-1]
+        checksum = row_checksum(raw)
+        with self._lock:
+            entry = self._entries.get(guid)
+            if entry is not None and entry[0] == checksum:
+                self._entries[guid] = (checksum, time.monotonic(), entry[2])
+                self._entries.move_to_end(guid)
+                return entry[2]
+
+        with metrics.timer("decode"):
+            record = (decode or self.decode)(row)
+        with self._lock:
+            self._entries[guid] = (checksum, time.monotonic(), record)
+            self._entries.move_to_end(guid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return record
+
+    # Drop a guid whose row has changed or been deleted
+    def invalidate(self, guid):
+        with self._lock:
+            self._entries.pop(guid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
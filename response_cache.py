@@ -0,0 +1,77 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+# Function to normalize command arguments so equivalent requests share a cache key
+def normalize_args(args):
+    return tuple(arg.strip().lower() if isinstance(arg, str) else arg for arg in args)
+
+
+# Built command responses keyed on (command, args), with single-flight for identical requests
+class ResponseCache:
+    def __init__(self, max_size=500, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Bumped whenever the codex data is reloaded, older entries are thrown away
+        self.version = 0
+        self._entries = OrderedDict()  # key -> (stored at, response)
+        self._in_flight = {}  # key -> future of the response being built
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Return the cached response, or build it once no matter how many callers ask at the same time
+    async def get_or_build(self, command, args, build):
+        key = (command, normalize_args(args))
+
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        # Someone is already building this response, wait for theirs
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        version = self.version
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await build()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            # Don't keep a response built from data that was reloaded meanwhile
+            if version == self.version:
+                self._entries[key] = (time.monotonic(), response)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return response
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    # Forget one cached response (e.g. Discord refused to send it)
+    def discard(self, command, args):
+        self._entries.pop((command, normalize_args(args)), None)
+
+    # Flush every cached response after the codex data changed
+    def bump_version(self):
+        self.version += 1
+        self._entries.clear()
+        self._in_flight.clear()
@@ -0,0 +1,399 @@
+import logging
+import discord
+from metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Reward table that always counts for POI drops (adjust based on your data)
+DEFAULT_REWARD_TABLE = "6064632349999038476"
+
+
+# Number of item names shown per page of /item's list view
+ITEM_PAGE_SIZE = 20
+
+# Discord limits: embeds per message, embed characters per message, options per select menu
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_SELECT_OPTIONS = 25
+# Text an embed field is filled with before "...and N more" (fields hold 1024 characters)
+FIELD_TEXT_LIMIT = 980
+
+# /mob and /hunt send embeds for up to this many matches, more switch to a select-menu picker
+CREATURE_EMBED_CAP = 10
+
+
+# A built command reply: message text and/or embeds, ready to be cached and sent
+class Response:
+    __slots__ = ("content", "embeds", "requested_by", "view")
+
+    def __init__(self, content=None, embeds=(), requested_by=False, view=None):
+        self.content = content
+        self.embeds = tuple(embeds)
+        # Add a "Requested by <user>" footer to the embeds when sending
+        self.requested_by = requested_by
+        # Function creating a fresh discord.ui.View for each message it is sent in
+        self.view = view
+
+
+# Function to add the "Requested by <user>" footer to a copy of a (possibly cached) embed
+def with_requester_footer(embed, user):
+    embed = embed.copy()
+    embed.set_footer(text=f"Requested by {user.name}", icon_url=user.display_avatar.url)
+    return embed
+
+
+# Function to split embeds into groups that fit in one message
+def batch_embeds(embeds):
+    batches = []
+    batch = []
+    batch_chars = 0
+    for embed in embeds:
+        if batch and (len(batch) == MAX_EMBEDS_PER_MESSAGE or batch_chars + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE):
+            batches.append(batch)
+            batch = []
+            batch_chars = 0
+        batch.append(embed)
+        batch_chars += len(embed)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Function to send a built response, packing up to 10 embeds into each followup message
+async def send_response(interaction: discord.Interaction, response: Response):
+    embeds = list(response.embeds)
+    if response.requested_by:
+        embeds = [with_requester_footer(embed, interaction.user) for embed in embeds]
+    batches = batch_embeds(embeds)
+
+    # Text (and its view) go out with the first batch of embeds
+    kwargs = {}
+    if response.content is not None:
+        kwargs["content"] = response.content
+    if response.view is not None:
+        kwargs["view"] = response.view()
+    if batches:
+        kwargs["embeds"] = batches.pop(0)
+
+    log.debug("Sending response with %d embed(s), %d more message(s) to follow", len(kwargs.get("embeds", [])), len(batches))
+    with metrics.timer("discord_send"):
+        await interaction.followup.send(**kwargs)
+        for batch in batches:
+            await interaction.followup.send(embeds=batch)
+
+
+# Select-menu picker for /mob and /hunt when too many creatures match to show them all
+class CreaturePickerView(discord.ui.View):
+    def __init__(self, records, build_embed):
+        super().__init__(timeout=180)
+        self.records = {str(record.guid)[:100]: record for record in records}
+        self.build_embed = build_embed
+        self.picker = discord.ui.Select(
+            placeholder="Choose one to see its details",
+            options=[
+                discord.SelectOption(
+                    label=(record.display_name or record.name or "Unknown")[:100],
+                    value=value,
+                    description=f"Level {record.level_range}"[:100]
+                )
+                for value, record in self.records.items()
+            ]
+        )
+        self.picker.callback = self.on_pick
+        self.add_item(self.picker)
+
+    async def on_pick(self, interaction: discord.Interaction):
+        record = self.records[self.picker.values[0]]
+        embed = with_requester_footer(self.build_embed(record), interaction.user)
+        await interaction.response.send_message(embed=embed)
+
+
+# Function to join lines into an embed field value, stopping before Discord's 1024 character limit
+# with "...and N more" (total is the number of lines there are when only the first ones were given)
+def cap_field_lines(lines, total=None):
+    total = len(lines) if total is None else total
+    shown = []
+    length = 0
+    for line in lines:
+        if length + len(line) > FIELD_TEXT_LIMIT:
+            break
+        shown.append(line)
+        length += len(line) + 1
+    if total > len(shown):
+        shown.append(f"...and {total - len(shown)} more")
+    return "\n".join(shown)
+
+
+# Function to say the results are typo suggestions when none of the names contain the query
+def closest_note(query, names):
+    term = query.strip().lower()
+    if any(term in (name or "").lower() for name in names):
+        return ""
+    return f"No exact match for '{query}', showing the closest matches.\n"
+
+
+# Function to build the /mob or /hunt reply: embeds for a few matches, a picker for many
+# (total is the number of matches when records only holds the first of them)
+def build_creature_response(records, query, what, build_embed, total=None):
+    total = len(records) if total is None else total
+    note = closest_note(query, [name for record in records for name in (record.name, record.display_name)])
+    if total <= CREATURE_EMBED_CAP:
+        with metrics.timer("embed_build"):
+            embeds = [build_embed(record) for record in records]
+        return Response(note.strip() or None, embeds=embeds, requested_by=True)
+
+    shown = records[:MAX_SELECT_OPTIONS]
+    content = note + f"Found {total} {what} matching '{query}'. Pick one below to see its details."
+    if total > len(shown):
+        content += f"\n({total - len(shown)} more, refine your search to see them.)"
+    return Response(content, view=lambda: CreaturePickerView(shown, build_embed))
+
+
+# Function to format one page of /item's list view
+def format_item_page(item_type, category, total, offset, page, note=""):
+    category_text = f" in category '{category}'" if category else ""
+    page_count = max((total + ITEM_PAGE_SIZE - 1) // ITEM_PAGE_SIZE, 1)
+    header = note + f"Found {total} items matching '{item_type}'{category_text}:\n"
+    item_list = "\n".join(f"- {name or 'Unnamed Item'}" for guid, name in page)
+    footer = f"\n\nPage {offset // ITEM_PAGE_SIZE + 1} of {page_count}. Please search for any items in this list."
+
+    response = header + item_list + footer
+    if len(response) > 2000:
+        response = header[:1900] + "(Names too long to list, please refine your search.)"
+    return response
+
+
+# Paginated /item list: each button press fetches just that page of names
+class ItemListView(discord.ui.View):
+    def __init__(self, codex, item_type, category, total, offset=0):
+        super().__init__(timeout=180)
+        self.codex = codex
+        self.item_type = item_type
+        self.category = category
+        self.total = total
+        self.offset = offset
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.offset <= 0
+        self.next_page.disabled = self.offset + ITEM_PAGE_SIZE >= self.total
+
+    async def show_page(self, interaction: discord.Interaction, offset):
+        total_any, total, page = await self.codex.item_name_page(self.item_type, self.category, offset, ITEM_PAGE_SIZE)
+        # The list may have shrunk since the last click, show its last page rather than one past the end
+        last_offset = max(total - 1, 0) // ITEM_PAGE_SIZE * ITEM_PAGE_SIZE
+        if offset > last_offset:
+            offset = last_offset
+            total_any, total, page = await self.codex.item_name_page(self.item_type, self.category, offset, ITEM_PAGE_SIZE)
+        self.total = total
+        self.offset = offset
+        self.update_buttons()
+        await interaction.response.edit_message(
+            content=format_item_page(self.item_type, self.category, total, offset, page),
+            view=self
+        )
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(self.offset - ITEM_PAGE_SIZE, 0))
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.offset + ITEM_PAGE_SIZE)
+
+
+# Function to build the /item reply
+async def build_item_response(codex, item_type, category=None):
+    # Only names are fetched here, the full item is fetched once a single one is left
+    total_any, total, page = await codex.item_name_page(item_type, category, 0, ITEM_PAGE_SIZE)
+
+    if total == 0:
+        category_text = f" in category '{category}'" if category else ""
+        if total_any == 0:
+            return Response(f"No {item_type} items found{category_text}.")
+        if item_type.lower().startswith("recipe:"):
+            return Response(f"No recipe found for '{item_type}'.")
+        return Response(f"No non-recipe {item_type} items found{category_text}.")
+
+    # Handle multiple items (paginated list view)
+    if total > 1:
+        log.debug("Multiple items found: %d", total)
+        note = closest_note(item_type, [name for guid, name in page])
+        content = format_item_page(item_type, category, total, 0, page, note)
+        if total <= ITEM_PAGE_SIZE:
+            return Response(content)
+        return Response(content, view=lambda: ItemListView(codex, item_type, category, total))
+
+    # Handle single item (detailed embed)
+    record = await codex.get_item(page[0][0])
+    if record is None:
+        return Response(f"No {item_type} items found.")
+    log.debug("Single item found: %s", record.item_name or "Unnamed Item")
+    with metrics.timer("embed_build"):
+        embed = await build_item_embed(codex, record, category)
+    return Response(closest_note(item_type, [record.item_name]).strip() or None, embeds=[embed])
+
+
+# Function to build the detailed embed for a single item
+async def build_item_embed(codex, record, category=None):
+    item_name = record.item_name or "Unnamed Item"
+    description = record.description
+    level = record.level
+    rarity_min = record.rarity_min
+    rarity_max = record.rarity_max
+    equip_slots = ", ".join(record.equip_slots)
+    section = record.section
+
+    embed = discord.Embed(
+        title=item_name,
+        description=description,
+        color=discord.Color.blue()
+    )
+    embed.add_field(name="Level", value=str(level), inline=True)
+    embed.add_field(name="Rarity", value=f"{rarity_min} to {rarity_max}", inline=True)
+    embed.add_field(name="Equip Slot", value=equip_slots, inline=True)
+    embed.add_field(name="Section", value=section or "N/A", inline=True)
+
+    if category:
+        embed.add_field(name="Category", value=category.capitalize(), inline=True)
+
+    if record.recipe_materials is not None:
+        materials = "\n".join(record.recipe_materials)
+        embed.add_field(
+            name="Crafting Recipe",
+            value=materials or "No materials specified.",
+            inline=False
+        )
+
+    sold_by = record.sold_by
+    sold_by_text = "\n".join(sold_by) if sold_by else "Not sold by any vendors."
+    embed.add_field(name="Sold By", value=sold_by_text, inline=False)
+
+    reward_from = record.reward_from
+    reward_from_text = "\n".join(
+        str(reward) for reward in reward_from[:5]
+    ) + ("..." if len(reward_from) > 5 else "") if reward_from else "No rewards specified."
+    embed.add_field(name="Reward From", value=reward_from_text, inline=False)
+
+    # Dropped By (Updated Logic)
+    dropped_by = record.dropped_by
+    if dropped_by:
+        dropped_by_text = "\n".join(
+            f"{display_name} (Level {level_range})"
+            for display_name, level_range in dropped_by[:5]
+        ) + ("..." if len(dropped_by) > 5 else "")
+    else:
+        # Check _droppedIn for location-based drops
+        dropped_in = record.dropped_in
+        if dropped_in:
+            pois = await codex.find_pois([poi_id for poi_name, poi_id in dropped_in])
+
+            poi_texts = []
+            for poi_name, poi_id in dropped_in:
+                poi = pois.get(poi_id)
+                if not poi:
+                    poi_texts.append(f"Dropped in {poi_name} (location data not found).")
+                    continue
+
+                # Mobs behind the reward tables that match this item
+                mobs = []
+                more = False
+                for table_id, (table_mobs, table_more) in poi.table_mobs.items():
+                    if table_id in reward_from or table_id == DEFAULT_REWARD_TABLE:
+                        mobs.extend(table_mobs)
+                        more = table_more
+                if mobs:
+                    poi_texts.append(f"Dropped in {poi_name}:\n" + "\n".join(mobs) + ("..." if more else ""))
+                else:
+                    poi_texts.append(f"Dropped in {poi_name} by humanoid enemies.")
+
+            dropped_by_text = cap_field_lines(poi_texts)
+        else:
+            dropped_by_text = "Not dropped by any enemies."
+    embed.add_field(name="Dropped By", value=dropped_by_text or "Not dropped by any enemies.", inline=False)
+    return embed
+
+
+# Function to build the embed for a hunting creature or mob record
+def build_creature_embed(codex, record, title_emoji, color, default_name, thumbnail_url=None):
+    name = record.display_name or record.name or default_name
+    description = record.description
+    level_range = record.level_range
+    respawn_time = record.respawn_time
+    location = record.location_text
+    # Drop list precomputed by the loot index
+    drops = codex.loot_index.drops_for(record.guid, record.drops)
+
+    # Format drops text
+    drops_text = "\n".join(f"• {drop}" for drop in drops[:5]) + ("\n• ..." if len(drops) > 5 else "") if drops else "No drops specified."
+
+    embed = discord.Embed(
+        title=f"{title_emoji} {name}",
+        description=f"*{description}*",  # Italicize the description
+        color=color
+    )
+    embed.add_field(name="📊 **Level Range**", value=f"`{level_range}`", inline=True)
+    embed.add_field(name="⏳ **Respawn Time**", value=f"`{respawn_time}`", inline=True)
+    embed.add_field(name="📍 **Location**", value=f"```{location}```", inline=False)
+    embed.add_field(name="🎁 **Drops**", value=f"{drops_text}", inline=False)
+
+    if thumbnail_url:
+        embed.set_thumbnail(url=thumbnail_url)
+    return embed
+
+
+# Function to build the /hunt reply
+async def build_hunt_response(codex, hunt_name):
+    hunts = await codex.find_hunts(hunt_name)
+    if not hunts:
+        log.debug("No hunting creatures found matching %r", hunt_name)
+        return Response(f"No hunting creatures found matching '{hunt_name}'.")
+
+    def build_embed(record):
+        return build_creature_embed(codex, record, "🦌", discord.Color.green(), "Unknown Creature")
+
+    return build_creature_response(hunts, hunt_name, "hunting creatures", build_embed)
+
+
+# Function to build the /mob reply (same as /hunt but with red color)
+async def build_mob_response(codex, mob_name):
+    # Only the mobs the reply can show are fetched
+    total, mobs = await codex.find_mobs(mob_name, MAX_SELECT_OPTIONS)
+    if not mobs:
+        log.debug("No mobs found matching %r", mob_name)
+        return Response(f"No mobs found matching '{mob_name}'.")
+
+    def build_embed(record):
+        # Add a thumbnail (optional, replace with a relevant image URL)
+        return build_creature_embed(codex, record, "🧿", discord.Color.red(), "Unknown Mob", thumbnail_url="https://i.imgur.com/xyz1234.png")
+
+    return build_creature_response(mobs, mob_name, "mobs", build_embed, total)
+
+
+# Function to build the /dropsource reply
+async def build_dropsource_response(codex, item_name):
+    item_names = codex.loot_index.find_items(item_name)
+    if not item_names:
+        return Response(f"No mobs or hunting creatures found that drop '{item_name}'.")
+
+    note = closest_note(item_name, item_names)
+    if len(item_names) > 1:
+        header = note + f"Found {len(item_names)} dropped items matching '{item_name}':\n"
+        lines = [f"- {name}" for name in item_names[:25]]
+        more = f"\n(Showing 25 of {len(item_names)}. Refine your search for more details.)" if len(item_names) > 25 else ""
+        return Response(header + "\n".join(lines) + more)
+
+    name, sources = codex.loot_index.sources_for(item_names[0])
+    lines = []
+    for source in sources[:20]:
+        emoji = "🦌" if source.kind == "hunt" else "🧿"
+        poi_text = f" — {source.poi}" if source.poi else ""
+        lines.append(f"{emoji} {source.name} (Level {source.level_range}){poi_text}")
+
+    embed = discord.Embed(
+        title=f"🎁 {name}",
+        description=f"Dropped by {len(sources)} mob(s)/creature(s)",
+        color=discord.Color.gold()
+    )
+    embed.add_field(name="Drop Sources", value=cap_field_lines(lines, len(sources)), inline=False)
+    return Response(note.strip() or None, embeds=[embed], requested_by=True)
@@ -0,0 +1,164 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from dotenv import load_dotenv
+from change_feed import load_checksums
+from db import configure
+from queries import reset_search_columns
+from snapshot import export_snapshot
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Worker processes to start (default one per CPU core) and shards spread across them
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", str(os.cpu_count() or 1)))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", str(WORKER_COUNT)))
+# Snapshot file every worker maps and serves from (re-exported here when the database changes)
+CODEX_SNAPSHOT = os.getenv("CODEX_SNAPSHOT", "codex.snap")
+CATALOG_REFRESH_SECONDS = int(os.getenv("CATALOG_REFRESH_SECONDS", "600"))
+# First worker's metrics port, the others use the ports after it (0 disables metrics)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Discord lets a bot identify one shard every 5 seconds, workers are started that far apart per shard
+SHARD_START_SECONDS = 5
+# Wait before restarting a worker that exited
+RESTART_DELAY_SECONDS = 10
+# How long workers get to shut down before they're killed
+STOP_TIMEOUT_SECONDS = 30
+
+log = logging.getLogger("shards")
+
+
+# Function to spread shard ids over the workers, shard 0 (which syncs the commands) goes to worker 0
+def assign_shards(shard_count, worker_count):
+    worker_count = max(1, min(worker_count, shard_count))
+    return [list(range(worker, shard_count, worker_count)) for worker in range(worker_count)]
+
+
+# Function to read the checksums of both tables, to tell whether the snapshot needs exporting again
+def load_table_checksums():
+    codex = load_checksums("codex")
+    hunts = load_checksums("hunting_creature")
+    if codex is None or hunts is None:
+        return None
+    return codex, hunts
+
+
+# One bot process running a fixed group of shards, restarted if it exits
+class Worker:
+    def __init__(self, number, shard_ids):
+        self.number = number
+        self.shard_ids = shard_ids
+        self.process = None
+        self.restart_at = None
+
+    def start(self):
+        env = dict(os.environ)
+        env.update(
+            SHARD_COUNT=str(SHARD_COUNT),
+            SHARD_IDS=",".join(str(shard_id) for shard_id in self.shard_ids),
+            CODEX_SNAPSHOT=CODEX_SNAPSHOT,
+            METRICS_PORT=str(METRICS_PORT + self.number if METRICS_PORT else 0),
+        )
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "os.py")
+        self.process = subprocess.Popen([sys.executable, script], env=env)
+        self.restart_at = None
+        log.info("Started worker %d (pid %d) with shards %s", self.number, self.process.pid, self.shard_ids)
+
+    # Restart the worker a while after it exited
+    def check(self):
+        if self.process is None or self.process.poll() is None:
+            return
+        if self.restart_at is None:
+            log.warning("Worker %d exited with code %s, restarting in %ds",
+                        self.number, self.process.returncode, RESTART_DELAY_SECONDS)
+            self.restart_at = time.monotonic() + RESTART_DELAY_SECONDS
+        elif time.monotonic() >= self.restart_at:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, deadline):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            log.warning("Worker %d didn't stop in time, killing it", self.number)
+            self.process.kill()
+            self.process.wait()
+
+
+def main():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s [supervisor] %(name)s: %(message)s")
+    # Only the supervisor reads the database, one connection is enough
+    configure(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT", "3306"),
+        database=os.getenv("DB_NAME"),
+        pool_size=1
+    )
+
+    # Checksums are taken before the export so a row changed during it is exported again next time
+    checksums = load_table_checksums()
+    if not export_snapshot(CODEX_SNAPSHOT):
+        if not os.path.exists(CODEX_SNAPSHOT):
+            log.error("Could not export %s and there is no earlier snapshot to serve", CODEX_SNAPSHOT)
+            return 1
+        log.warning("Could not export %s, workers will serve the earlier snapshot", CODEX_SNAPSHOT)
+        checksums = None
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    workers = [Worker(number, shard_ids) for number, shard_ids in enumerate(assign_shards(SHARD_COUNT, WORKER_COUNT))]
+    log.info("Running %d shard(s) in %d worker(s) from %s", SHARD_COUNT, len(workers), CODEX_SNAPSHOT)
+    next_start = time.monotonic()
+    next_refresh = time.monotonic() + CATALOG_REFRESH_SECONDS
+    while not stopping:
+        now = time.monotonic()
+        # Start the workers one at a time so their shards don't identify all at once
+        for worker in workers:
+            if worker.process is None:
+                if now >= next_start:
+                    worker.start()
+                    next_start = now + SHARD_START_SECONDS * len(worker.shard_ids)
+                break
+        for worker in workers:
+            worker.check()
+
+        # Export a new snapshot when either table changed, the workers map it on their next catalog refresh
+        if now >= next_refresh:
+            # Check the schema again, picks up checksum columns migrate.py added meanwhile
+            reset_search_columns()
+            latest = load_table_checksums()
+            if latest is not None and latest != checksums and export_snapshot(CODEX_SNAPSHOT):
+                checksums = latest
+            next_refresh = time.monotonic() + CATALOG_REFRESH_SECONDS
+        time.sleep(1)
+
+    log.info("Stopping %d worker(s)", len(workers))
+    for worker in workers:
+        worker.stop()
+    deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+    for worker in workers:
+        worker.wait(deadline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
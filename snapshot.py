@@ -0,0 +1,471 @@
+import hashlib
+import json
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+import mariadb
+from dotenv import load_dotenv
+from catalog import Catalog, name_row
+from db import configure, get_db_connection
+from fuzzy import ranked_ids
+from hunt_snapshot import HuntSnapshot, load_hunt_records
+from loot_index import DropSource, LootIndex
+from prefix_index import PrefixIndex
+from projection import POI_PROJECTION
+from queries import get_codex_records
+from records import CreatureRecord, ItemRecord, PoiRecord, RecordCache, decode_poi_row
+from trigram_index import TrigramIndex
+
+log = logging.getLogger(__name__)
+
+# File layout: header, 8-byte aligned sections, then a marshal'd directory of the sections
+MAGIC = b"CODEXSNP"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIIQQ")  # magic, format version, marshal version, directory offset, directory length
+
+
+# Function to hash a string key to the 64-bit value the lookup tables are sorted on
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# Function to flatten a record into a marshal-able tuple of its slots
+def encode_record(record):
+    return marshal.dumps(tuple(getattr(record, slot) for slot in type(record).__slots__))
+
+
+# Collects named sections and writes them to a snapshot file
+class SnapshotWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sections = {}
+        f.write(b"\0" * HEADER.size)
+
+    def add(self, name, data):
+        # Keep every section 8-byte aligned so it can be viewed as an array in place
+        padding = -self.f.tell() % 8
+        self.f.write(b"\0" * padding)
+        self.sections[name] = (self.f.tell(), len(data))
+        self.f.write(data)
+
+    # Strings (or encoded values) stored back to back with an offset array
+    def add_blobs(self, name, blobs):
+        offsets = array("Q", [0])
+        data = bytearray()
+        for blob in blobs:
+            data += blob.encode("utf-8") if isinstance(blob, str) else blob
+            offsets.append(len(data))
+        self.add(f"{name}.offsets", offsets.tobytes())
+        self.add(f"{name}.data", bytes(data))
+
+    # key -> value lookup table: keys, encoded values and a hash table sorted by key hash
+    def add_table(self, name, items):
+        keys = []
+        values = []
+        for key, value in items:
+            keys.append(key)
+            values.append(value)
+        order = sorted(range(len(keys)), key=lambda slot: key_hash(keys[slot]))
+        self.add_blobs(f"{name}.keys", keys)
+        self.add_blobs(f"{name}.values", values)
+        self.add(f"{name}.hashes", array("Q", [key_hash(keys[slot]) for slot in order]).tobytes())
+        self.add(f"{name}.slots", array("I", order).tobytes())
+
+    # A freshly built TrigramIndex (no removed documents)
+    def add_trigram_index(self, name, index):
+        grams = {}
+        postings = array("I")
+        for gram, doc_ids in index.postings.items():
+            grams[gram] = (len(postings), len(doc_ids))
+            postings.extend(doc_ids)
+        self.add_blobs(f"{name}.keys", index.keys)
+        self.add_blobs(f"{name}.guids", index.guids)
+        self.add(f"{name}.grams", marshal.dumps(grams))
+        self.add(f"{name}.postings", postings.tobytes())
+
+    def add_prefix_index(self, name, index):
+        self.add_blobs(f"{name}.keys", index.keys)
+        self.add_blobs(f"{name}.names", [entry_name for key, entry_name in index.entries])
+
+    def finish(self, meta):
+        directory = marshal.dumps({"meta": meta, "sections": self.sections})
+        offset = self.f.tell()
+        self.f.write(directory)
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, offset, len(directory)))
+
+
+# Function to read every codex and hunting_creature row into records and the indexes built from them
+def load_codex_snapshot_data():
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    name_rows = []
+    items = {}
+    mobs = {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT guid, section, data FROM codex")
+        for guid, section, raw in cursor.fetchall():
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError as e:
+                log.warning("Error decoding JSON data for row %s: %s", guid, e)
+                continue
+            name_rows.append(name_row(guid, section, data))
+            if data.get("itemName"):
+                items[guid] = ItemRecord.from_data(guid, section, data)
+            if section == "mobs":
+                mobs[guid] = CreatureRecord.from_data(guid, data)
+    except mariadb.Error as e:
+        log.error("Database error in load_codex_snapshot_data: %s", e)
+        return None
+    finally:
+        conn.close()
+
+    # Only POIs that items are dropped in are ever looked up
+    poi_ids = list({poi_id for item in items.values() for poi_name, poi_id in item.dropped_in})
+    poi_cache = RecordCache(decode_poi_row, max_size=len(poi_ids) + 1)
+    pois = {poi.guid: poi for poi in get_codex_records(poi_ids, poi_cache, POI_PROJECTION)} if poi_ids else {}
+
+    hunts = load_hunt_records()
+    if hunts is None:
+        return None
+    return name_rows, items, mobs, pois, hunts
+
+
+# Function to compile codex and hunting_creature into a snapshot file (replaced atomically)
+def export_snapshot(path):
+    start = time.perf_counter()
+    loaded = load_codex_snapshot_data()
+    if loaded is None:
+        return False
+    name_rows, items, mobs, pois, hunts = loaded
+
+    # Build the indexes with the same code the bot uses, then store them as they are
+    catalog = Catalog()
+    catalog.update(name_rows)
+    hunt_snapshot = HuntSnapshot()
+    hunt_snapshot.replace(hunts)
+    loot_index = LootIndex()
+    loot_index.update("mob", mobs.values())
+    loot_index.update("hunt", hunts)
+
+    # Items are listed straight from the index documents: name and armor tag set of each
+    tag_sets = list(dict.fromkeys(info[1] for info in catalog.item_info.values()))
+    tag_set_ids = {tags: number for number, tags in enumerate(tag_sets)}
+    item_names = []
+    item_tags = array("H")
+    for guid in catalog.items.guids:
+        name, tags = catalog.item_info[guid]
+        item_names.append(name)
+        item_tags.append(tag_set_ids[tags])
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        writer = SnapshotWriter(f)
+        writer.add_table("items", ((guid, encode_record(record)) for guid, record in items.items()))
+        writer.add_table("mobs", ((guid, encode_record(record)) for guid, record in mobs.items()))
+        writer.add_table("pois", ((guid, encode_record(record)) for guid, record in pois.items()))
+        writer.add_table("hunts", ((record.guid, encode_record(record)) for record in hunts))
+
+        writer.add_trigram_index("catalog.items", catalog.items)
+        writer.add_blobs("catalog.item_names", item_names)
+        writer.add("catalog.item_tags", item_tags.tobytes())
+        writer.add_trigram_index("catalog.mobs", catalog.mobs)
+        writer.add_prefix_index("catalog.item_prefixes", PrefixIndex(catalog.item_names))
+        writer.add_prefix_index("catalog.mob_prefixes", PrefixIndex(catalog.mob_names))
+
+        writer.add_trigram_index("hunts.names", hunt_snapshot.name_index)
+        writer.add_prefix_index("hunts.prefixes", hunt_snapshot.prefixes)
+
+        writer.add_table("loot.sources", (
+            (key, marshal.dumps((name, [(s.kind, s.guid, s.name, s.level_range, s.poi) for s in sources])))
+            for key, (name, sources) in loot_index.sources.items()
+        ))
+        writer.add_trigram_index("loot.names", loot_index.names)
+        writer.add_prefix_index("loot.prefixes", loot_index.prefixes)
+
+        writer.finish({
+            "format": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "created": time.time(),
+            "tag_sets": tuple(tag_sets),
+            "counts": {"items": len(items), "mobs": len(mobs), "pois": len(pois), "hunts": len(hunts)},
+        })
+    os.replace(temp_path, path)
+    log.info("Wrote %s in %.1fs: %d items, %d mobs, %d POIs, %d hunting creatures",
+             path, time.perf_counter() - start, len(items), len(mobs), len(pois), len(hunts))
+    return True
+
+
+# Read-only sequence of the strings (or raw values) stored by SnapshotWriter.add_blobs
+class BlobList(Sequence):
+    def __init__(self, snapshot, name, decode=None):
+        self.offsets = snapshot.section(f"{name}.offsets").cast("Q")
+        self.data = snapshot.section(f"{name}.data")
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        blob = self.data[self.offsets[index]:self.offsets[index + 1]]
+        return self.decode(blob) if self.decode else str(blob, "utf-8")
+
+
+# Read-only mapping over a table stored by SnapshotWriter.add_table
+class MappedTable(Mapping):
+    def __init__(self, snapshot, name, decode):
+        self.keys_list = BlobList(snapshot, f"{name}.keys")
+        self.values_list = BlobList(snapshot, f"{name}.values", decode)
+        self.hashes = snapshot.section(f"{name}.hashes").cast("Q")
+        self.slots = snapshot.section(f"{name}.slots").cast("I")
+
+    def _slot(self, key):
+        if not isinstance(key, str):
+            return None
+        hashed = key_hash(key)
+        position = bisect_left(self.hashes, hashed)
+        while position < len(self.hashes) and self.hashes[position] == hashed:
+            slot = self.slots[position]
+            if self.keys_list[slot] == key:
+                return slot
+            position += 1
+        return None
+
+    def __getitem__(self, key):
+        slot = self._slot(key)
+        if slot is None:
+            raise KeyError(key)
+        return self.values_list[slot]
+
+    def __contains__(self, key):
+        return self._slot(key) is not None
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __len__(self):
+        return len(self.keys_list)
+
+
+# Posting lists of a mapped trigram index, sliced out of the file on demand
+class MappedPostings:
+    def __init__(self, snapshot, name):
+        self.grams = marshal.loads(snapshot.section(f"{name}.grams"))
+        self.postings = snapshot.section(f"{name}.postings").cast("I")
+
+    def get(self, gram, default=None):
+        entry = self.grams.get(gram)
+        if entry is None:
+            return default
+        start, count = entry
+        return self.postings[start:start + count]
+
+    def __len__(self):
+        return len(self.grams)
+
+
+# TrigramIndex whose documents and postings live in the snapshot file (searches work as usual)
+class MappedTrigramIndex(TrigramIndex):
+    def __init__(self, snapshot, name):
+        self.keys = BlobList(snapshot, f"{name}.keys")
+        self.guids = BlobList(snapshot, f"{name}.guids")
+        self._snapshot = snapshot
+        self._name = name
+        self._postings = None
+        self.removed = 0
+
+    # The trigram table is only read on the first search
+    @property
+    def postings(self):
+        if self._postings is None:
+            self._postings = MappedPostings(self._snapshot, self._name)
+        return self._postings
+
+    def __len__(self):
+        return len(self.guids)
+
+    # There's no guid -> document id table in the file, finding a guid would mean decoding every one
+    def __contains__(self, guid):
+        raise TypeError("snapshot indexes can't look up guids")
+
+    def add(self, guid, names):
+        raise TypeError("snapshot indexes are read-only")
+
+    def remove(self, guid):
+        raise TypeError("snapshot indexes are read-only")
+
+
+# (key, name) pairs of a mapped prefix index
+class PrefixEntries(Sequence):
+    def __init__(self, keys, names):
+        self.keys = keys
+        self.names = names
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        return self.keys[index], self.names[index]
+
+
+# PrefixIndex whose sorted entries live in the snapshot file
+class MappedPrefixIndex(PrefixIndex):
+    def __init__(self, snapshot, name):
+        self.keys = BlobList(snapshot, f"{name}.keys")
+        self.entries = PrefixEntries(self.keys, BlobList(snapshot, f"{name}.names"))
+
+    def add(self, name):
+        raise TypeError("snapshot indexes are read-only")
+
+    def remove(self, name):
+        raise TypeError("snapshot indexes are read-only")
+
+
+# Catalog served from a snapshot: /item listings come straight from the index documents
+class SnapshotCatalog(Catalog):
+    def __init__(self, snapshot):
+        super().__init__()
+        self.items = MappedTrigramIndex(snapshot, "catalog.items")
+        self.mobs = MappedTrigramIndex(snapshot, "catalog.mobs")
+        self.item_prefixes = MappedPrefixIndex(snapshot, "catalog.item_prefixes")
+        self.mob_prefixes = MappedPrefixIndex(snapshot, "catalog.mob_prefixes")
+        self.item_doc_names = BlobList(snapshot, "catalog.item_names")
+        self.item_doc_tags = snapshot.section("catalog.item_tags").cast("H")
+        self.tag_sets = snapshot.meta["tag_sets"]
+        self.loaded = True
+
+    def update(self, rows):
+        raise TypeError("snapshot catalogs are read-only")
+
+    def apply(self, rows, deleted=()):
+        raise TypeError("snapshot catalogs are read-only")
+
+    def item_matches(self, term, category=None):
+        matches = ranked_ids(self.items, term)
+        if category:
+            tag = f"item.gear.armor.{category.lower()}"
+            allowed = {number for number, tags in enumerate(self.tag_sets) if tag in tags}
+            doc_tags = self.item_doc_tags
+            matches = matches.where(lambda doc_id: doc_tags[doc_id] in allowed)
+        return matches
+
+    def item_name(self, doc_id):
+        return self.item_doc_names[doc_id]
+
+
+# Function to turn a marshal'd loot table entry back into (item name, [DropSource])
+def decode_loot_sources(blob):
+    name, sources = marshal.loads(blob)
+    return name, [DropSource(*source) for source in sources]
+
+
+# Function to build a record decoder for one record class
+def record_decoder(cls):
+    return lambda blob: cls(*marshal.loads(blob))
+
+
+# A memory-mapped snapshot file written by export_snapshot
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, marshal_version, offset, length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a codex snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} is snapshot format {version}, this bot reads format {FORMAT_VERSION}")
+        if marshal_version != marshal.version:
+            # Records, indexes and the directory are marshal'd, whose format belongs to the Python that wrote them
+            raise ValueError(f"{path} was written with marshal format {marshal_version}, this Python reads {marshal.version}")
+        directory = marshal.loads(self._view[offset:offset + length])
+        self.meta = directory["meta"]
+        self._sections = directory["sections"]
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {self.meta['byteorder']}-endian machine")
+
+        self.items = MappedTable(self, "items", record_decoder(ItemRecord))
+        self.mobs = MappedTable(self, "mobs", record_decoder(CreatureRecord))
+        self.pois = MappedTable(self, "pois", record_decoder(PoiRecord))
+        self.hunts = MappedTable(self, "hunts", record_decoder(CreatureRecord))
+
+    # Zero-copy view of a section
+    def section(self, name):
+        offset, length = self._sections[name]
+        return self._view[offset:offset + length]
+
+    # Check whether the file on disk has been replaced since it was mapped
+    def is_stale(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (self.stat.st_ino, self.stat.st_mtime_ns)
+
+    def catalog(self):
+        return SnapshotCatalog(self)
+
+    def hunt_snapshot(self):
+        hunt_snapshot = HuntSnapshot()
+        hunt_snapshot.records = self.hunts
+        hunt_snapshot.name_index = MappedTrigramIndex(self, "hunts.names")
+        hunt_snapshot.prefixes = MappedPrefixIndex(self, "hunts.prefixes")
+        hunt_snapshot.loaded = True
+        return hunt_snapshot
+
+    def loot_index(self):
+        loot_index = LootIndex()
+        loot_index.sources = MappedTable(self, "loot.sources", decode_loot_sources)
+        # Records from the snapshot already carry their drops
+        loot_index.drops = {}
+        loot_index.names = MappedTrigramIndex(self, "loot.names")
+        loot_index.prefixes = MappedPrefixIndex(self, "loot.prefixes")
+        loot_index.loaded = True
+        return loot_index
+
+
+# Function to map a snapshot file (None if it is missing or unreadable)
+def open_snapshot(path):
+    start = time.perf_counter()
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        log.error("Could not load codex snapshot %s: %s", path, e)
+        return None
+    created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.meta["created"]))
+    log.info("Mapped codex snapshot %s from %s in %.1f ms: %s",
+             path, created, (time.perf_counter() - start) * 1000, snapshot.meta["counts"])
+    return snapshot
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    load_dotenv()
+    configure(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT", "3306"),
+        database=os.getenv("DB_NAME"),
+        pool_size=1
+    )
+    output = sys.argv[1] if len(sys.argv) > 1 else os.getenv("CODEX_SNAPSHOT", "codex.snap")
+    sys.exit(0 if export_snapshot(output) else 1)
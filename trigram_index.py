@@ -0,0 +1,89 @@
+from array import array
+
+
+# Function to list the distinct trigrams of a lowercase string
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2) if "\n" not in text[i:i + 3]}
+
+
+# Substring search index: trigram -> sorted array of document ids
+class TrigramIndex:
+    def __init__(self):
+        self.keys = []      # document id -> lowercase searchable text (None once removed)
+        self.guids = []     # document id -> guid
+        self.doc_ids = {}   # guid -> document id
+        self.postings = {}  # trigram -> array('I') of document ids, ascending
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, guid):
+        return guid in self.doc_ids
+
+    # Add (or replace) the names for a guid
+    def add(self, guid, names):
+        key = "\n".join(name.lower() for name in names if name)
+        doc_id = self.doc_ids.get(guid)
+        if doc_id is not None:
+            if self.keys[doc_id] == key:
+                return
+            self.remove(guid)
+        if not key:
+            return
+
+        doc_id = len(self.keys)
+        self.keys.append(key)
+        self.guids.append(guid)
+        self.doc_ids[guid] = doc_id
+        # New ids are always the largest, so appending keeps every posting list sorted
+        for gram in trigrams(key):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array("I")
+            postings.append(doc_id)
+
+    # Remove a guid, its postings are dropped the next time the index is compacted
+    def remove(self, guid):
+        doc_id = self.doc_ids.pop(guid, None)
+        if doc_id is None:
+            return
+        self.keys[doc_id] = None
+        self.removed += 1
+        if self.removed > 1024 and self.removed * 2 > len(self.keys):
+            self.compact()
+
+    # Rebuild the postings without removed documents
+    def compact(self):
+        live = [(guid, key) for guid, key in zip(self.guids, self.keys) if key is not None]
+        self.keys = []
+        self.guids = []
+        self.doc_ids = {}
+        self.postings = {}
+        self.removed = 0
+        for guid, key in live:
+            self.add(guid, [key])
+
+    # Find the document ids whose names contain term, ascending
+    def search_ids(self, term):
+        term = term.lower()
+        keys = self.keys
+
+        if len(term) < 3:
+            # Too short for a trigram, check every name
+            return [doc_id for doc_id, key in enumerate(keys) if key is not None and term in key]
+
+        # Only documents in the shortest posting list can match, verify those directly
+        candidates = None
+        for gram in trigrams(term):
+            postings = self.postings.get(gram)
+            if postings is None:
+                return []
+            if candidates is None or len(postings) < len(candidates):
+                candidates = postings
+        matches = []
+        for doc_id in candidates:
+            key = keys[doc_id]
+            if key is not None and term in key:
+                matches.append(doc_id)
+        return matches